@@ -0,0 +1,91 @@
+"""
+Measure the memory of many concurrent async solves, with and without
+`compact=True`.
+
+    python benchmarks/compact_memory.py [solves]
+
+Every solve hands the client a fresh set of nine images, as a scraper
+would, and is held at its first poll until all of them are in flight. The
+traced memory is reported per solve while they are in flight, and again for
+the results once they are done.
+"""
+
+import asyncio
+import base64
+import gc
+import os
+import sys
+import tracemalloc
+
+from nopecha.api._base import AsyncAPIClient, UniformResponse
+
+IMAGE_BYTES = 1500
+ANSWERS = [True, False] * 4 + [True]
+
+
+class ParkedClient(AsyncAPIClient):
+    """Accepts every job at once, and answers polls when `release` is set."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.release = asyncio.Event()
+        self.parked = 0
+
+    async def _request_raw(self, method, url, body=None):
+        if method == "POST":
+            return UniformResponse(200, { "data": "job" })
+        self.parked += 1
+        await self.release.wait()
+        return UniformResponse(200, { "data": list(ANSWERS) })
+
+
+def images():
+    return [
+        base64.b64encode(os.urandom(IMAGE_BYTES)).decode() for _ in range(9)
+    ]
+
+
+def traced() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+async def measure(solves: int, compact: bool) -> None:
+    api = ParkedClient("bench", compact=compact)
+    tracemalloc.start()
+    baseline = traced()
+
+    tasks = []
+    for _ in range(solves):
+        tasks.append(asyncio.ensure_future(api.recognize_hcaptcha("cat", images())))
+        await asyncio.sleep(0)  # submitted before the next images are made
+    while api.parked < solves:
+        await asyncio.sleep(0)
+    for _ in range(5):
+        await asyncio.sleep(0)  # let finished POSTs clean up
+    in_flight = traced() - baseline
+    _, peak = tracemalloc.get_traced_memory()
+
+    api.release.set()
+    results = await asyncio.gather(*tasks)
+    del tasks
+    done = traced() - baseline
+    tracemalloc.stop()
+
+    mode = "compact" if compact else "default"
+    print(
+        f"{mode:>8}: {in_flight / solves / 1024:6.1f} KiB per solve in flight, "
+        f"{done / solves:5.0f} B per result, "
+        f"peak {peak / 2**20:.0f} MiB for {len(results)} solves"
+    )
+
+
+def main(solves: int) -> None:
+    payload = len(images()[0]) * 9
+    print(f"{solves} concurrent solves, {payload / 1024:.1f} KiB of images each")
+    asyncio.run(measure(solves, compact=False))
+    asyncio.run(measure(solves, compact=True))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,64 @@
+"""
+Exercise multi-host selection and failover against local stand-ins.
+
+    python benchmarks/endpoint_failover.py [solves]
+
+Starts a fast, a slow and a flaky host. The flaky one is stopped halfway
+through, and the script reports where the solves went and each host's
+circuit state. Fails if any request reached the stopped host after its
+circuit opened.
+"""
+
+import asyncio
+import sys
+import time
+
+from standin import StandIn
+from nopecha.api.httpx import AsyncHTTPXAPIClient
+
+
+async def main(solves: int) -> None:
+    fast = await StandIn(delay=0.005).start()
+    slow = await StandIn(delay=0.05).start()
+    flaky = await StandIn(delay=0.001).start()
+    hosts = { "fast": fast, "slow": slow, "flaky": flaky }
+
+    api = AsyncHTTPXAPIClient("bench", hosts=[s.host for s in hosts.values()])
+
+    flaky_host = flaky.host  # unknown once the server is stopped
+
+    def flaky_stats():
+        return next(e for e in api.endpoints.stats() if e.host == flaky_host)
+
+    start = time.perf_counter()
+    requests_when_opened = None
+    for i in range(solves):
+        if i == solves // 2:
+            await flaky.stop()
+            stopped = time.perf_counter()
+        await api.solve_raw({ "type": "hcaptcha", "sitekey": "x", "url": "x" })
+        if requests_when_opened is None and flaky_stats().state == "open":
+            requests_when_opened = flaky_stats().requests
+    end = time.perf_counter()
+
+    print(
+        f"{solves} solves in {end - start:.2f}s, "
+        f"{end - stopped:.2f}s after the flaky host stopped"
+    )
+    for name, server in hosts.items():
+        print(f"{name:>6}: {server.requests} requests served")
+    for stats in api.endpoints.stats():
+        print(stats)
+
+    # once its circuit is open, no request may go to the stopped host
+    assert requests_when_opened is not None, "the flaky host's circuit never opened"
+    assert flaky_stats().requests == requests_when_opened, "requests sent to an open host"
+    print("no requests reached the stopped host after its circuit opened")
+
+    await api.client.aclose()
+    await fast.stop()
+    await slow.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
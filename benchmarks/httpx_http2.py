@@ -0,0 +1,54 @@
+"""
+Compare the httpx client over HTTP/1.1 and HTTP/2 against a local stand-in.
+
+    python benchmarks/httpx_http2.py [concurrency]
+
+Requires `httpx[http2]`. Reports sockets opened and solve latency.
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from standin import StandIn
+from nopecha.api.httpx import AsyncHTTPXAPIClient
+
+
+async def run(label: str, api: AsyncHTTPXAPIClient, concurrency: int) -> None:
+    server = await StandIn().start()
+    api.host = server.host
+
+    latencies = []
+
+    async def solve():
+        start = time.perf_counter()
+        await api.solve_raw({ "type": "hcaptcha", "sitekey": "x", "url": "x" })
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(solve() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    await api.client.aclose()
+    await server.stop()
+
+    latencies.sort()
+    print(
+        f"{label:>8}: {server.connections:4d} sockets, "
+        f"wall {wall * 1000:7.1f}ms, "
+        f"mean {statistics.mean(latencies) * 1000:7.1f}ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.1f}ms"
+    )
+
+
+async def main(concurrency: int) -> None:
+    await run("http/1.1", AsyncHTTPXAPIClient("bench"), concurrency)
+    # the stand-in is cleartext, so http2 has to be spoken with prior knowledge
+    await run(
+        "http/2", AsyncHTTPXAPIClient("bench", http2=True, http1=False), concurrency
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
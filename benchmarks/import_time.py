@@ -0,0 +1,44 @@
+"""
+Measure how long a fresh interpreter takes to import each client module.
+
+    python benchmarks/import_time.py [runs]
+
+Each import runs in its own subprocess, the median wall time is reported next
+to a bare interpreter start for reference.
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+STATEMENTS = {
+    "python": "pass",
+    "nopecha": "import nopecha",
+    "nopecha.api": "import nopecha.api",
+    "create_client()": "from nopecha.api import create_client; create_client()",
+    "nopecha.api.urllib": "import nopecha.api.urllib",
+    "nopecha.api.requests": "import nopecha.api.requests",
+    "nopecha.api.httpx": "import nopecha.api.httpx",
+    "nopecha.api.aiohttp": "import nopecha.api.aiohttp",
+}
+
+
+def measure(statement: str, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", statement], capture_output=True)
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return float("nan")
+    return statistics.median(timings)
+
+
+def main(runs: int) -> None:
+    for label, statement in STATEMENTS.items():
+        print(f"{label:>22}: {measure(statement, runs) * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
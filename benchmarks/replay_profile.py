@@ -0,0 +1,65 @@
+"""
+Profile the client's own overhead by replaying recorded traffic.
+
+    python benchmarks/replay_profile.py [solves]
+
+Records a few solves against a local stand-in that rate limits and answers
+polls with IncompleteJob, then replays them through `ReplayAPIClient` with
+time compressed to zero, under cProfile and then tracemalloc.
+"""
+
+import asyncio
+import cProfile
+import os
+import pstats
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from standin import StandIn
+from nopecha.api.httpx import AsyncHTTPXAPIClient
+from nopecha.api.replay import ReplayAPIClient, record
+
+BODY = { "type": "hcaptcha", "sitekey": "x", "url": "x" }
+
+
+async def capture(path: str) -> None:
+    server = await StandIn(delay=0.005, incomplete=2, ratelimit_every=7).start()
+    api = AsyncHTTPXAPIClient("bench")
+    api.host = server.host
+    with record(api, path) as recording:
+        await asyncio.gather(*(api.solve_raw(BODY) for _ in range(20)))
+    await api.client.aclose()
+    await server.stop()
+    print(f"recorded {len(recording)} responses, {os.path.getsize(path)} bytes")
+
+
+def main(solves: int) -> None:
+    path = os.path.join(tempfile.mkdtemp(), "solves.jsonl.gz")
+    asyncio.run(capture(path))
+    api = ReplayAPIClient("bench", recording=path)
+
+    start = time.perf_counter()
+    for _ in range(solves):
+        api.solve_raw(BODY)
+    wall = time.perf_counter() - start
+    print(f"{solves} replayed solves in {wall:.2f}s, {wall / solves * 1e6:.1f}us each")
+
+    profile = cProfile.Profile()
+    profile.runcall(lambda: [api.solve_raw(BODY) for _ in range(solves)])
+    pstats.Stats(profile).sort_stats("tottime").print_stats(12)
+
+    tracemalloc.start()
+    for _ in range(solves):
+        api.solve_raw(BODY)
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"tracemalloc peak {peak / 1024:.0f} KiB")
+    for stat in snapshot.statistics("lineno")[:8]:
+        print(stat)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,161 @@
+"""
+Local stand-in for the NopeCHA API, used by the benchmarks in this directory.
+
+Speaks HTTP/1.1 with keep-alive and cleartext HTTP/2 (prior knowledge, needs
+the 'h2' package). Every POST queues a job, every GET returns a solution.
+Counts accepted connections so benchmarks can report socket usage.
+
+`incomplete` answers that many polls per job with IncompleteJob before the
+solution, and `ratelimit_every` answers every n-th request with a 429.
+"""
+
+import asyncio
+import json
+import typing
+
+H2_PREFACE = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n"
+
+
+class StandIn:
+    def __init__(
+        self, *, delay: float = 0.02, incomplete: int = 0, ratelimit_every: int = 0
+    ):
+        self.delay = delay
+        self.incomplete = incomplete
+        self.ratelimit_every = ratelimit_every
+        self._polls: typing.Dict[str, int] = {}
+        self.connections = 0
+        self.requests = 0
+        self.server: typing.Optional[asyncio.AbstractServer] = None
+        self._writers: typing.Set[asyncio.StreamWriter] = set()
+
+    @property
+    def host(self) -> str:
+        assert self.server is not None
+        port = self.server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def start(self) -> "StandIn":
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def stop(self) -> None:
+        assert self.server is not None
+        self.server.close()
+        # drop keep-alive connections too, like a host that went away
+        for writer in list(self._writers):
+            writer.close()
+        await self.server.wait_closed()
+
+    async def respond(self, method: str, path: str) -> typing.Tuple[int, dict]:
+        self.requests += 1
+        number = self.requests
+        await asyncio.sleep(self.delay)
+        if self.ratelimit_every and number % self.ratelimit_every == 0:
+            return 429, { "error": 11, "message": "Rate limited" }
+        if method == "POST":
+            return 200, { "data": f"job-{number}" }
+        if path.startswith("/status/"):
+            return 200, { "plan": "bench", "credit": 1_000_000, "quota": 1_000_000 }
+
+        job = path.partition("id=")[2]
+        polls = self._polls[job] = self._polls.get(job, 0) + 1
+        if polls <= self.incomplete:
+            return 409, { "error": 14, "message": "Incomplete job" }
+        del self._polls[job]
+        return 200, { "data": ["token"] }
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            head = await reader.readexactly(len(H2_PREFACE))
+            if head == H2_PREFACE:
+                await self._serve_h2(head, reader, writer)
+            else:
+                await self._serve_h1(head, reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _serve_h1(self, head: bytes, reader, writer):
+        buffer = head
+        while True:
+            while b"\r\n\r\n" not in buffer:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    return
+                buffer += chunk
+            raw_headers, buffer = buffer.split(b"\r\n\r\n", 1)
+            lines = raw_headers.decode("latin-1").split("\r\n")
+            method, path, _ = lines[0].split(" ", 2)
+            length = 0
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            while len(buffer) < length:
+                buffer += await reader.readexactly(length - len(buffer))
+            buffer = buffer[length:]
+
+            status, payload = await self.respond(method, path)
+            body = json.dumps(payload).encode()
+            writer.write(
+                b"HTTP/1.1 %d OK\r\ncontent-type: application/json\r\n" % status
+                + b"content-length: %d\r\n\r\n" % len(body)
+                + body
+            )
+            await writer.drain()
+
+    async def _serve_h2(self, head: bytes, reader, writer):
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False)
+        )
+        conn.initiate_connection()
+        streams: typing.Dict[int, typing.Tuple[str, str]] = {}
+        pending: typing.Set[asyncio.Task] = set()
+
+        async def reply(stream_id: int, method: str, path: str):
+            status, payload = await self.respond(method, path)
+            body = json.dumps(payload).encode()
+            conn.send_headers(
+                stream_id,
+                [
+                    (":status", str(status)),
+                    ("content-type", "application/json"),
+                    ("content-length", str(len(body))),
+                ],
+            )
+            conn.send_data(stream_id, body, end_stream=True)
+            writer.write(conn.data_to_send())
+            await writer.drain()
+
+        data = head
+        while data:
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    headers = {
+                        (k.decode() if isinstance(k, bytes) else k): (
+                            v.decode() if isinstance(v, bytes) else v
+                        )
+                        for k, v in event.headers
+                    }
+                    streams[event.stream_id] = (headers[":method"], headers[":path"])
+                elif isinstance(event, h2.events.DataReceived):
+                    conn.acknowledge_received_data(
+                        event.flow_controlled_length, event.stream_id
+                    )
+                elif isinstance(event, h2.events.StreamEnded):
+                    method, path = streams.pop(event.stream_id)
+                    task = asyncio.ensure_future(reply(event.stream_id, method, path))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            writer.write(conn.data_to_send())
+            await writer.drain()
+            data = await reader.read(65536)
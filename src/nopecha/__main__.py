@@ -0,0 +1,27 @@
+"""
+Command line entry point.
+
+    python -m nopecha batch requests.jsonl -o results.jsonl
+    python -m nopecha gateway --key YOUR_API_KEY
+"""
+
+import sys
+
+COMMANDS = {
+    "batch": "nopecha.api.batch",
+    "gateway": "nopecha.api.gateway",
+}
+
+
+def main() -> None:
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        print(f"usage: python -m nopecha {{{','.join(COMMANDS)}}} ...", file=sys.stderr)
+        sys.exit(2)
+
+    from importlib import import_module
+
+    import_module(COMMANDS[sys.argv[1]]).main(sys.argv[2:])
+
+
+if __name__ == "__main__":
+    main()
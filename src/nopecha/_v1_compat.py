@@ -15,19 +15,18 @@ client = UrllibAPIClient(api_key)
 class Token:
     @classmethod
     def solve(cls, **kwargs):
-        client.key = api_key
-        return client.solve_raw(typing.cast(TokenRequest, kwargs))
+        body = typing.cast(TokenRequest, kwargs)
+        return client.with_key(api_key).solve_raw(body)
 
 
 class Recognition:
     @classmethod
     def solve(cls, **kwargs):
-        client.key = api_key
-        return client.recognize_raw(typing.cast(RecognitionRequest, kwargs))
+        body = typing.cast(RecognitionRequest, kwargs)
+        return client.with_key(api_key).recognize_raw(body)
 
 
 class Balance:
     @classmethod
     def get(cls):
-        client.key = api_key
-        return client.status()
+        return client.with_key(api_key).status()
@@ -1 +1,58 @@
-__all__ = []
+import typing
+from importlib.util import find_spec
+
+if typing.TYPE_CHECKING:
+    from ._base import APIClient, AsyncAPIClient
+
+__all__ = ["create_client"]
+
+# (module providing the http library, nopecha module, client class), fastest first
+_SYNC_BACKENDS = (
+    ("requests", "requests", "RequestsAPIClient"),
+    ("httpx", "httpx", "HTTPXAPIClient"),
+    (None, "urllib", "UrllibAPIClient"),
+)
+_ASYNC_BACKENDS = (
+    ("aiohttp", "aiohttp", "AiohttpAPIClient"),
+    ("httpx", "httpx", "AsyncHTTPXAPIClient"),
+)
+
+
+def _pick_backend(
+    backends: typing.Tuple[typing.Tuple[typing.Optional[str], str, str], ...]
+) -> typing.Tuple[str, str]:
+    for library, module, name in backends:
+        # find_spec only looks the library up, nothing is imported until the
+        # chosen backend is actually used
+        if library is None or find_spec(library) is not None:
+            return module, name
+    libraries = ", ".join(library for library, _, _ in backends if library)
+    raise ImportError(
+        f"No supported http library installed, install one of: {libraries}"
+    )
+
+
+def create_client(
+    key: typing.Optional[str] = None,
+    mode: typing.Literal["sync", "async"] = "sync",
+    **kwargs: typing.Any,
+) -> typing.Union["APIClient", "AsyncAPIClient"]:
+    """
+    Create a client using the most efficient installed http library.
+
+    sync: requests, then httpx, then the built-in urllib.
+    async: aiohttp, then httpx.
+
+    Extra keyword arguments are passed to the client class.
+    """
+    if mode == "sync":
+        module, name = _pick_backend(_SYNC_BACKENDS)
+    elif mode == "async":
+        module, name = _pick_backend(_ASYNC_BACKENDS)
+    else:
+        raise ValueError(f"mode must be 'sync' or 'async', got {mode!r}")
+
+    from importlib import import_module
+
+    client_class = getattr(import_module(f"{__name__}.{module}"), name)
+    return client_class(key, **kwargs)
@@ -1,5 +1,10 @@
+import collections
+import copy
+import threading
+import time
 import typing
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from logging import getLogger
 from urllib.parse import urlencode
 
@@ -20,7 +25,34 @@ from .types import (
     TurnstileTokenRequest,
 )
 from ._throttle import exp_throttle, linear_throttle, sleeper, async_sleeper
-from ._validate import validate_image
+from ._validate import validate_image, validate_images
+from .budget import BudgetExceeded
+from .cancel import Cancelled, _sleep
+from .chunks import DEFAULT_IMAGE_BATCH_LIMITS, merge, split
+from .compact import Result, _Payload, _release
+from .proxy import ProxyPool
+from .retry import _Attempts, RetryBudgetExceeded, RetryCause, classify
+from .scheduler import DeadlineExceeded
+
+if typing.TYPE_CHECKING:
+    import asyncio
+
+    from .budget import Budget
+    from .duplicates import NearDuplicateIndex
+    from .endpoints import EndpointPool
+    from .retry import RetryPolicy
+    from .scheduler import AsyncScheduler, Scheduler
+
+# asyncio and concurrent.futures are imported where they are used, so that
+# short-lived sync programs do not pay for them at import time
+
+# failures that say nothing about the proxy a solve was using
+_proxy_neutral_errors = (
+    BudgetExceeded,
+    DeadlineExceeded,
+    RetryBudgetExceeded,
+    Cancelled,
+)
 
 logger = getLogger(__name__)
 _error_message = (
@@ -30,16 +62,88 @@ _error_message = (
 )
 
 
+def _distribution_version(name: str) -> str:
+    try:
+        from importlib.metadata import version
+    except ImportError:  # python 3.7
+        import pkg_resources
+
+        return pkg_resources.get_distribution(name).version
+    return version(name)
+
+
+@lru_cache(maxsize=None)
+def _build_useragent(client_name: str) -> str:
+    try:
+        package_version = _distribution_version("nopecha")
+    except:
+        package_version = "unknown"
+
+    try:
+        import platform
+
+        system = platform.platform()
+        python_version = (
+            platform.python_implementation() + "/" + platform.python_version()
+        )
+    except:
+        system = "unknown"
+        python_version = "unknown"
+
+    signficant_dependencies = ["requests", "httpx", "aiohttp"]
+    versions = []
+    for dependency in signficant_dependencies:
+        try:
+            version = _distribution_version(dependency)
+            versions.append(f"{dependency}/{version}")
+        except:
+            pass
+
+    return f"NopeCHA-Python/{package_version} ({python_version}; {client_name}; {system}) {' '.join(versions)}".strip()
+
+
 class UniformResponse(typing.NamedTuple):
     status_code: int
     body: typing.Optional[dict]
 
 
+class _Job(typing.NamedTuple):
+    """What a call keeps of its job while polling, the body is not kept."""
+
+    host: str
+    id: str
+    url: str
+
+
+_ClientT = typing.TypeVar("_ClientT", bound="APIClientMixin")
+
+
 class APIClientMixin:
+    # attributes owned by one client instance and never shared with `with_key`
+    # views, e.g. handles to background workers and the wrappers installed
+    # by `replay.record`
+    _instance_local: typing.Tuple[str, ...] = (
+        "_status_cache",
+        "_request_raw",
+        "with_key",
+    )
+
     key: str | None = None
     post_max_attempts: int = 10
     get_max_attempts: int = 120
     host = "https://api.nopecha.com"
+    scheduler: typing.Union["Scheduler", "AsyncScheduler", None] = None
+    budget: typing.Optional["Budget"] = None
+    endpoints: typing.Optional["EndpointPool"] = None
+    retry: typing.Optional["RetryPolicy"] = None
+    duplicates: typing.Optional["NearDuplicateIndex"] = None
+    status_ttl: typing.Optional[float] = None
+    compact: bool = False
+    # image recognitions above these sizes are split into concurrent jobs
+    image_batch_limits: typing.Dict[str, int]
+    # ids of jobs the server accepted but a cancelled call stopped polling
+    abandoned_jobs: typing.Deque[str]
+    _status_cache: typing.Optional[typing.Tuple[float, StatusResponse]] = None
 
     def __init__(
         self,
@@ -47,23 +151,84 @@ class APIClientMixin:
         *,
         post_max_attempts: int = 10,
         get_max_attempts: int = 120,
+        scheduler: typing.Union["Scheduler", "AsyncScheduler", None] = None,
+        budget: typing.Optional["Budget"] = None,
+        status_ttl: typing.Optional[float] = None,
+        hosts: typing.Optional[typing.Sequence[str]] = None,
+        retry: typing.Optional["RetryPolicy"] = None,
+        duplicates: typing.Optional["NearDuplicateIndex"] = None,
+        compact: bool = False,
     ):
         self.key = key
         self.post_max_attempts = post_max_attempts
         self.get_max_attempts = get_max_attempts
+        self.scheduler = scheduler
+        self.budget = budget
+        self.status_ttl = status_ttl
+        self.retry = retry
+        self.duplicates = duplicates
+        self.compact = compact
+        self.image_batch_limits = dict(DEFAULT_IMAGE_BATCH_LIMITS)
+        self.abandoned_jobs = collections.deque(maxlen=1000)
+        if hosts is not None:
+            from .endpoints import EndpointPool
+
+            self.endpoints = EndpointPool(hosts)
+            self.host = self.endpoints.hosts[0]
 
     def _should_retry(self, response: UniformResponse) -> bool:
-        # automatically retry on 5xx errors and 429
-        if response.status_code >= 500:
+        return self._retry_cause(response) is not None
+
+    def _retry_cause(self, response: UniformResponse) -> typing.Optional[RetryCause]:
+        # automatically retry on transport and 5xx errors, 429 and empty bodies
+        cause = classify(response)
+        if cause == RetryCause.TRANSPORT:
+            logger.debug("Request did not reach the server, retrying")
+        elif cause == RetryCause.SERVER_ERROR:
             logger.debug(f"Server returned {response.status_code}, retrying")
-            return True
-        elif response.status_code == 429:
+        elif cause == RetryCause.RATE_LIMITED:
             logger.debug("Server is ratelimiting us, retrying")
-            return True
-        elif response.body is None:
+        elif cause == RetryCause.EMPTY_BODY:
             logger.debug("Server returned no data, retrying")
-            return True
-        return False
+        return cause
+
+    def _response(self, response: typing.Any) -> typing.Any:
+        return Result(response["data"]) if self.compact else response
+
+    def _pick_host(self) -> str:
+        return self.host if self.endpoints is None else self.endpoints.choose()
+
+    def _failover_host(
+        self, host: str, response: UniformResponse
+    ) -> typing.Optional[str]:
+        # a failed host is passed over for another healthy one at once,
+        # backing off is for when no other host is left
+        if self.endpoints is None or self._is_healthy(response):
+            return None
+        return self.endpoints.alternative(host)
+
+    def _status_url(self, host: str) -> str:
+        return f"{host}/status/?" + urlencode({ "key": self.key })
+
+    def _cached_status(self) -> typing.Optional[StatusResponse]:
+        # stale-while-revalidate: a stale entry is still returned right away,
+        # and a refresh is started in the background
+        if self.status_ttl is None or self._status_cache is None:
+            return None
+        fetched_at, status = self._status_cache
+        if time.monotonic() - fetched_at >= self.status_ttl:
+            self._revalidate_status()
+        return status
+
+    def _revalidate_status(self) -> None:
+        raise NotImplementedError
+
+    def _abandon(self, job_id: str) -> None:
+        logger.debug("Stopped polling job %s, the call was cancelled", job_id)
+        self.abandoned_jobs.append(job_id)
+
+    def _is_healthy(self, response: UniformResponse) -> bool:
+        return response.status_code < 500 and response.body is not None
 
     def _get_headers(self) -> dict:
         headers = {
@@ -74,61 +239,123 @@ class APIClientMixin:
         return headers
 
     def _get_useragent(self) -> str:
-        try:
-            import pkg_resources
-
-            package_version = pkg_resources.get_distribution("nopecha").version
-        except:
-            package_version = "unknown"
-
-        try:
-            import platform
-
-            system = platform.platform()
-            python_version = (
-                platform.python_implementation() + "/" + platform.python_version()
+        # computed once per client class, pkg_resources lookups are slow
+        return _build_useragent(type(self).__name__)
+
+    def with_key(self: _ClientT, key: typing.Optional[str]) -> _ClientT:
+        """
+        Return a view of this client that uses `key` for every call.
+
+        The view shares the underlying session/connection pool, so one warm
+        client can serve many credentials without mutating `self.key`. A
+        client with a `budget` only makes views for its own key, since the
+        budget tracks the credit of a single account.
+        """
+        if self.budget is not None and key != self.key:
+            raise ValueError(
+                "a client with a budget cannot make views for other keys, "
+                "give each key its own client and Budget"
             )
-        except:
-            system = "unknown"
-            python_version = "unknown"
-
-        signficant_dependencies = ["requests", "httpx", "aiohttp"]
-        versions = []
-        for dependency in signficant_dependencies:
-            try:
-                import pkg_resources
-
-                version = pkg_resources.get_distribution(dependency).version
-                versions.append(f"{dependency}/{version}")
-            except:
-                pass
-
-        return f"NopeCHA-Python/{package_version} ({python_version}; {type(self).__name__}; {system}) {' '.join(versions)}".strip()
+        clone = copy.copy(self)
+        for name in clone._instance_local:
+            clone.__dict__.pop(name, None)
+        clone.key = key
+        return clone
 
 
 class APIClient(ABC, APIClientMixin):
+    _instance_local = APIClientMixin._instance_local + (
+        "_keepalive_stop",
+        "_status_refresh",
+    )
+    _keepalive_stop: typing.Optional[threading.Event] = None
+    _status_refresh: typing.Optional[threading.Thread] = None
+
     @abstractmethod
     def _request_raw(
         self, method: str, url: str, body: typing.Optional[dict] = None
     ) -> UniformResponse:
         raise NotImplementedError
 
-    def _request(self, endpoint: str, body: typing.Any) -> typing.Any:
-        if self.key:
-            body["key"] = self.key
-        job_id = self._request_post(endpoint, body)
-
-        get_endpoint = endpoint + "?" + urlencode({ "key": self.key, "id": job_id })
-        return self._request_get(get_endpoint)
-
-    def _request_post(self, endpoint: str, body: typing.Any) -> str:
-        for _ in sleeper(exp_throttle(max_attempts=self.post_max_attempts)):
-            job_request = self._request_raw("POST", endpoint, body)
-            if self._should_retry(job_request):
+    def _send(
+        self, host: str, method: str, url: str, body: typing.Optional[dict] = None
+    ) -> UniformResponse:
+        if self.endpoints is None:
+            return self._request_raw(method, url, body)
+        start = time.monotonic()
+        try:
+            response = self._request_raw(method, url, body)
+        except BaseException:
+            self.endpoints.abandon(host)
+            raise
+        elapsed = time.monotonic() - start
+        self.endpoints.record(host, self._is_healthy(response), elapsed)
+        return response
+
+    def _request(self, path: str, body: typing.Any) -> typing.Any:
+        job = self._start(path, body)
+        try:
+            return self._response(self._request_get(job.host, job.url))
+        except (Cancelled, KeyboardInterrupt):
+            self._abandon(job.id)
+            raise
+
+    def _start(self, path: str, body: typing.Any) -> _Job:
+        # read the key once, and never mutate the caller's body
+        key = self.key
+        if key:
+            body = { **body, "key": key }
+        host, job_id = self._submit(path, body)
+        if self.compact:
+            _release(body)
+
+        # poll the host that accepted the job, it is the one that knows it
+        url = f"{host}{path}?" + urlencode({ "key": key, "id": job_id })
+        return _Job(host, job_id, url)
+
+    def _submit(self, path: str, body: typing.Any) -> typing.Tuple[str, str]:
+        if self.budget is None:
+            return self._schedule_post(path, body)
+
+        if self.budget.needs_refresh():
+            self.budget.update(self._fetch_status())
+        cost = self.budget.cost_of(body)
+        # reserved right away, the delay is our place in the queue
+        delay = self.budget.take(cost)
+        try:
+            if delay:
+                _sleep(delay)
+            return self._schedule_post(path, body)
+        except BaseException:
+            self.budget.refund(cost)
+            raise
+
+    def _schedule_post(
+        self, path: str, body: typing.Any
+    ) -> typing.Tuple[str, str]:
+        if self.scheduler is None:
+            return self._request_post(path, body)
+        with self.scheduler.slot():
+            return self._request_post(path, body)
+
+    def _request_post(
+        self, path: str, body: typing.Any
+    ) -> typing.Tuple[str, str]:
+        attempts = _Attempts(self.retry)
+        throttle = exp_throttle(max_attempts=self.post_max_attempts)
+        for _ in sleeper(attempts.delays(throttle)):
+            host = self._pick_host()
+            job_request = self._send(host, "POST", host + path, body)
+            other = self._failover_host(host, job_request)
+            while other is not None and attempts.retry(self._retry_cause(job_request)):
+                host = other
+                job_request = self._send(host, "POST", host + path, body)
+                other = self._failover_host(host, job_request)
+            if attempts.retry(self._retry_cause(job_request)):
                 continue
             assert job_request.body is not None
             if "data" in job_request.body:
-                return job_request.body["data"]
+                return host, job_request.body["data"]
             elif "error" in job_request.body:
                 raise RuntimeError(f"Server returned error: {job_request.body}")
 
@@ -136,10 +363,12 @@ class APIClient(ABC, APIClientMixin):
             _error_message.format("accept job", self.post_max_attempts, "post")
         )
 
-    def _request_get(self, endpoint: str) -> typing.Any:
-        for _ in sleeper(linear_throttle(max_attempts=self.get_max_attempts)):
-            job_request = self._request_raw("GET", endpoint)
-            if self._should_retry(job_request):
+    def _request_get(self, host: str, endpoint: str) -> typing.Any:
+        attempts = _Attempts(self.retry)
+        throttle = linear_throttle(max_attempts=self.get_max_attempts)
+        for _ in sleeper(attempts.delays(throttle)):
+            job_request = self._send(host, "GET", endpoint)
+            if attempts.retry(self._retry_cause(job_request)):
                 continue
             assert job_request.body is not None
             if "data" in job_request.body:
@@ -153,20 +382,129 @@ class APIClient(ABC, APIClientMixin):
             _error_message.format("solve job", self.get_max_attempts, "get")
         )
 
+    def _ping(self) -> bool:
+        host = self._pick_host()
+        response = self._send(host, "GET", self._status_url(host))
+        return self._is_healthy(response)
+
+    def warmup(self, n_connections: int = 1) -> int:
+        """
+        Open `n_connections` pooled connections to the API host by issuing
+        that many concurrent status calls, so the first solve does not pay for
+        dns, tcp and tls. Returns the number of healthy responses.
+        """
+        if n_connections <= 1:
+            healthy = int(self._ping())
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(n_connections) as pool:
+                pings = pool.map(lambda _: self._ping(), range(n_connections))
+                healthy = sum(pings)
+
+        if healthy == 0:
+            logger.warning("Warmup failed, %s is not reachable", self.host)
+        return healthy
+
+    def start_keepalive(self, interval: float = 15, n_connections: int = 1) -> None:
+        """
+        Re-warm the pool every `interval` seconds from a daemon thread so idle
+        connections are not dropped by the server. Stop with `stop_keepalive`.
+        """
+        if self._keepalive_stop is not None:
+            return
+        stop = self._keepalive_stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.warmup(n_connections)
+
+        threading.Thread(target=run, name="nopecha-keepalive", daemon=True).start()
+
+    def stop_keepalive(self) -> None:
+        if self._keepalive_stop is not None:
+            self._keepalive_stop.set()
+            self._keepalive_stop = None
+
     def recognize_raw(self, body: RecognitionRequest) -> RecognitionResponse:
-        return self._request(f"{self.host}/", body)
+        return self._request("/", body)
+
+    def _recognize_images(self, body: ImageRecognitionRequest) -> RecognitionResponse:
+        if self.duplicates is None:
+            return self._recognize_chunked(body)
+        lookup = self.duplicates.lookup(body)
+        if lookup.complete:
+            return self._response(lookup.response())
+        remaining = lookup.remaining(body)
+        if self.compact:
+            _release(body)
+        return self._response(lookup.merge(self._recognize_chunked(remaining)))
+
+    def _recognize_chunked(self, body: ImageRecognitionRequest) -> RecognitionResponse:
+        chunks = split(body, self.image_batch_limits.get(body["type"]))
+        if len(chunks) == 1:
+            return self.recognize_raw(body)
+        sizes = [len(chunk["image_data"]) for chunk in chunks]
+        if self.compact:
+            _release(body)
+
+        from concurrent.futures import ThreadPoolExecutor
+        from contextvars import copy_context
+
+        def outcome(future):
+            error = future.exception()
+            return future.result() if error is None else error
+
+        with ThreadPoolExecutor(min(len(chunks), 16)) as pool:
+            # each chunk runs in a copy of our context, so job options and
+            # cancel tokens apply to it too
+            futures = [
+                pool.submit(copy_context().run, self.recognize_raw, chunk)
+                for chunk in chunks
+            ]
+            outcomes = [outcome(future) for future in futures]
+        return self._response(merge(sizes, outcomes))
 
     def solve_raw(self, body: TokenRequest) -> TokenResponse:
-        return self._request(f"{self.host}/token/", body)
+        pool = body.get("proxy")
+        if not isinstance(pool, ProxyPool):
+            return self._request("/token/", body)
+        with pool.lease(_proxy_neutral_errors) as proxy:
+            return self._request("/token/", { **body, "proxy": proxy })
 
     def status(self) -> StatusResponse:
-        url = f"{self.host}/status/?" + urlencode({ "key": self.key })
-        for _ in sleeper(linear_throttle(max_attempts=self.get_max_attempts)):
-            status_request = self._request_raw("GET", url)
-            if self._should_retry(status_request):
+        cached = self._cached_status()
+        if cached is not None:
+            return cached
+        return self._fetch_status()
+
+    def _revalidate_status(self) -> None:
+        if self._status_refresh is not None and self._status_refresh.is_alive():
+            return
+
+        def run():
+            try:
+                self._fetch_status()
+            except Exception as e:
+                logger.warning("Background status refresh failed: %s", e)
+
+        self._status_refresh = threading.Thread(
+            target=run, name="nopecha-status", daemon=True
+        )
+        self._status_refresh.start()
+
+    def _fetch_status(self) -> StatusResponse:
+        attempts = _Attempts(self.retry)
+        throttle = linear_throttle(max_attempts=self.get_max_attempts)
+        for _ in sleeper(attempts.delays(throttle)):
+            host = self._pick_host()
+            status_request = self._send(host, "GET", self._status_url(host))
+            if attempts.retry(self._retry_cause(status_request)):
                 continue
             assert status_request.body is not None
-            return typing.cast(StatusResponse, status_request.body)
+            status = typing.cast(StatusResponse, status_request.body)
+            self._status_cache = (time.monotonic(), status)
+            return status
 
         raise RuntimeError(
             _error_message.format("get status", self.get_max_attempts, "get")
@@ -175,15 +513,16 @@ class APIClient(ABC, APIClientMixin):
     def recognize_hcaptcha(
         self, task: str, images: typing.List[str]
     ) -> RecognitionResponse:
-        for image in images:
-            validate_image(image)
+        validate_images(images)
+        # a copy owned by the client, compact clients empty it once submitted
+        images = _Payload(images)
 
         body: ImageRecognitionRequest = {
             "type": "hcaptcha",
             "task": task,
             "image_data": images,
         }
-        return typing.cast(RecognitionResponse, self.recognize_raw(body))
+        return typing.cast(RecognitionResponse, self._recognize_images(body))
 
     def recognize_hcaptcha_area_select(
         self,
@@ -228,18 +567,18 @@ class APIClient(ABC, APIClientMixin):
     def recognize_recaptcha(
         self, task: str, images: typing.List[str]
     ) -> RecognitionResponse:
-        for image in images:
-            validate_image(image)
+        validate_images(images)
+        images = _Payload(images)
 
-        if not 9 >= len(images) >= 1:
-            raise ValueError("recaptcha requires 1-9 images")
+        if not images:
+            raise ValueError("recaptcha requires at least 1 image")
 
         body: ImageRecognitionRequest = {
             "type": "recaptcha",
             "task": task,
             "image_data": images,
         }
-        return typing.cast(RecognitionResponse, self.recognize_raw(body))
+        return typing.cast(RecognitionResponse, self._recognize_images(body))
 
     def recognize_funcaptcha(self, task: str, image: str) -> RecognitionResponse:
         validate_image(image)
@@ -247,9 +586,9 @@ class APIClient(ABC, APIClientMixin):
         body: ImageRecognitionRequest = {
             "type": "funcaptcha",
             "task": task,
-            "image_data": [image],
+            "image_data": _Payload([image]),
         }
-        return typing.cast(RecognitionResponse, self.recognize_raw(body))
+        return typing.cast(RecognitionResponse, self._recognize_images(body))
 
     def recognize_awscaptcha(self, audio: str) -> RecognitionResponse:
         validate_image(audio)
@@ -266,7 +605,7 @@ class APIClient(ABC, APIClientMixin):
         url: str,
         *,
         enterprise: bool = False,
-        proxy: typing.Optional[Proxy] = None,
+        proxy: typing.Union[Proxy, ProxyPool, None] = None,
         useragent: typing.Optional[str] = None,
         rqdata: typing.Optional[str] = None,
     ) -> TokenResponse:
@@ -296,7 +635,7 @@ class APIClient(ABC, APIClientMixin):
         url: str,
         *,
         enterprise: bool = False,
-        proxy: typing.Optional[Proxy] = None,
+        proxy: typing.Union[Proxy, ProxyPool, None] = None,
         useragent: typing.Optional[str] = None,
         sdata: typing.Optional[str] = None,
     ) -> TokenResponse:
@@ -326,7 +665,7 @@ class APIClient(ABC, APIClientMixin):
         url: str,
         *,
         enterprise: bool = False,
-        proxy: typing.Optional[Proxy] = None,
+        proxy: typing.Union[Proxy, ProxyPool, None] = None,
         useragent: typing.Optional[str] = None,
         action: typing.Optional[str] = None,
     ) -> TokenResponse:
@@ -355,7 +694,7 @@ class APIClient(ABC, APIClientMixin):
         sitekey: str,
         url: str,
         *,
-        proxy: typing.Optional[Proxy] = None,
+        proxy: typing.Union[Proxy, ProxyPool, None] = None,
         useragent: typing.Optional[str] = None,
         action: typing.Optional[str] = None,
         cdata: typing.Optional[str] = None,
@@ -377,27 +716,102 @@ class APIClient(ABC, APIClientMixin):
 
 
 class AsyncAPIClient(APIClientMixin):
+    _instance_local = APIClientMixin._instance_local + (
+        "_keepalive_task",
+        "_status_refresh",
+    )
+    _keepalive_task: typing.Optional["asyncio.Task[None]"] = None
+    _status_refresh: typing.Optional["asyncio.Task[StatusResponse]"] = None
+
     async def _request_raw(
         self, method: str, url: str, body: typing.Optional[dict] = None
     ) -> UniformResponse:
         raise NotImplementedError
 
-    async def _request(self, endpoint: str, body: typing.Any) -> typing.Any:
-        if self.key:
-            body["key"] = self.key
-        job_id = await self._request_post(endpoint, body)
-
-        get_endpoint = endpoint + "?" + urlencode({ "key": self.key, "id": job_id })
-        return await self._request_get(get_endpoint)
-
-    async def _request_post(self, endpoint: str, body: typing.Any) -> str:
-        async for _ in async_sleeper(exp_throttle(max_attempts=self.post_max_attempts)):
-            job_request = await self._request_raw("POST", endpoint, body)
-            if self._should_retry(job_request):
+    async def _send(
+        self, host: str, method: str, url: str, body: typing.Optional[dict] = None
+    ) -> UniformResponse:
+        if self.endpoints is None:
+            return await self._request_raw(method, url, body)
+        start = time.monotonic()
+        try:
+            response = await self._request_raw(method, url, body)
+        except BaseException:
+            # cancelled mid-request, says nothing about the host's health
+            self.endpoints.abandon(host)
+            raise
+        elapsed = time.monotonic() - start
+        self.endpoints.record(host, self._is_healthy(response), elapsed)
+        return response
+
+    async def _request(self, path: str, body: typing.Any) -> typing.Any:
+        import asyncio
+
+        job = await self._start(path, body)
+        try:
+            return self._response(await self._request_get(job.host, job.url))
+        except (Cancelled, asyncio.CancelledError):
+            self._abandon(job.id)
+            raise
+
+    async def _start(self, path: str, body: typing.Any) -> _Job:
+        # read the key once, and never mutate the caller's body
+        key = self.key
+        if key:
+            body = { **body, "key": key }
+        host, job_id = await self._submit(path, body)
+        if self.compact:
+            _release(body)
+
+        # poll the host that accepted the job, it is the one that knows it
+        url = f"{host}{path}?" + urlencode({ "key": key, "id": job_id })
+        return _Job(host, job_id, url)
+
+    async def _submit(self, path: str, body: typing.Any) -> typing.Tuple[str, str]:
+        if self.budget is None:
+            return await self._schedule_post(path, body)
+
+        import asyncio
+
+        if self.budget.needs_refresh():
+            self.budget.update(await self._fetch_status())
+        cost = self.budget.cost_of(body)
+        # reserved right away, the delay is our place in the queue
+        delay = self.budget.take(cost)
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            return await self._schedule_post(path, body)
+        except BaseException:
+            self.budget.refund(cost)
+            raise
+
+    async def _schedule_post(
+        self, path: str, body: typing.Any
+    ) -> typing.Tuple[str, str]:
+        if self.scheduler is None:
+            return await self._request_post(path, body)
+        async with self.scheduler.slot():
+            return await self._request_post(path, body)
+
+    async def _request_post(
+        self, path: str, body: typing.Any
+    ) -> typing.Tuple[str, str]:
+        attempts = _Attempts(self.retry)
+        throttle = exp_throttle(max_attempts=self.post_max_attempts)
+        async for _ in async_sleeper(attempts.delays(throttle)):
+            host = self._pick_host()
+            job_request = await self._send(host, "POST", host + path, body)
+            other = self._failover_host(host, job_request)
+            while other is not None and attempts.retry(self._retry_cause(job_request)):
+                host = other
+                job_request = await self._send(host, "POST", host + path, body)
+                other = self._failover_host(host, job_request)
+            if attempts.retry(self._retry_cause(job_request)):
                 continue
             assert job_request.body is not None
             if "data" in job_request.body:
-                return job_request.body["data"]
+                return host, job_request.body["data"]
             elif "error" in job_request.body:
                 raise RuntimeError(f"Server returned error: {job_request.body}")
 
@@ -405,12 +819,12 @@ class AsyncAPIClient(APIClientMixin):
             _error_message.format("accept job", self.post_max_attempts, "post")
         )
 
-    async def _request_get(self, endpoint: str) -> typing.Any:
-        async for _ in async_sleeper(
-            linear_throttle(max_attempts=self.get_max_attempts)
-        ):
-            job_request = await self._request_raw("GET", endpoint)
-            if self._should_retry(job_request):
+    async def _request_get(self, host: str, endpoint: str) -> typing.Any:
+        attempts = _Attempts(self.retry)
+        throttle = linear_throttle(max_attempts=self.get_max_attempts)
+        async for _ in async_sleeper(attempts.delays(throttle)):
+            job_request = await self._send(host, "GET", endpoint)
+            if attempts.retry(self._retry_cause(job_request)):
                 continue
             assert job_request.body is not None
             if "data" in job_request.body:
@@ -424,22 +838,136 @@ class AsyncAPIClient(APIClientMixin):
             _error_message.format("solve job", self.get_max_attempts, "get")
         )
 
+    async def _ping(self) -> bool:
+        host = self._pick_host()
+        response = await self._send(host, "GET", self._status_url(host))
+        return self._is_healthy(response)
+
+    async def warmup(self, n_connections: int = 1) -> int:
+        """
+        Open `n_connections` pooled connections to the API host by issuing
+        that many concurrent status calls, so the first solve does not pay for
+        dns, tcp and tls. Returns the number of healthy responses.
+        """
+        import asyncio
+
+        results = await asyncio.gather(*(self._ping() for _ in range(n_connections)))
+        healthy = sum(results)
+
+        if healthy == 0:
+            logger.warning("Warmup failed, %s is not reachable", self.host)
+        return healthy
+
+    def start_keepalive(self, interval: float = 15, n_connections: int = 1) -> None:
+        """
+        Re-warm the pool every `interval` seconds from a background task so
+        idle connections are not dropped by the server. Must be called from a
+        running event loop, stop with `stop_keepalive`.
+        """
+        import asyncio
+
+        if self._keepalive_task is not None and not self._keepalive_task.done():
+            return
+
+        async def run():
+            while True:
+                await asyncio.sleep(interval)
+                await self.warmup(n_connections)
+
+        self._keepalive_task = asyncio.ensure_future(run())
+
+    async def stop_keepalive(self) -> None:
+        import asyncio
+
+        task, self._keepalive_task = self._keepalive_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
     async def recognize_raw(self, body: RecognitionRequest) -> RecognitionResponse:
         return await self._request("/", body)
 
+    async def _recognize_images(
+        self, body: ImageRecognitionRequest
+    ) -> RecognitionResponse:
+        if self.duplicates is None:
+            return await self._recognize_chunked(body)
+
+        import asyncio
+
+        from .duplicates import _hashes
+
+        # decoding images is slow, it must not hold up the other solves
+        loop = asyncio.get_running_loop()
+        hashes = await loop.run_in_executor(None, _hashes, body["image_data"])
+        lookup = self.duplicates.lookup(body, hashes)
+        if lookup.complete:
+            return self._response(lookup.response())
+        remaining = lookup.remaining(body)
+        if self.compact:
+            _release(body)
+        return self._response(lookup.merge(await self._recognize_chunked(remaining)))
+
+    async def _recognize_chunked(
+        self, body: ImageRecognitionRequest
+    ) -> RecognitionResponse:
+        chunks = split(body, self.image_batch_limits.get(body["type"]))
+        if len(chunks) == 1:
+            return await self.recognize_raw(body)
+        sizes = [len(chunk["image_data"]) for chunk in chunks]
+        if self.compact:
+            _release(body)
+
+        import asyncio
+
+        outcomes = await asyncio.gather(
+            *(self.recognize_raw(chunk) for chunk in chunks), return_exceptions=True
+        )
+        return self._response(merge(sizes, outcomes))
+
     async def solve_raw(self, body: TokenRequest) -> TokenResponse:
-        return await self._request("/token/", body)
+        pool = body.get("proxy")
+        if not isinstance(pool, ProxyPool):
+            return await self._request("/token/", body)
+        async with pool.async_lease(_proxy_neutral_errors) as proxy:
+            body = { **body, "proxy": proxy }
+            return await self._request("/token/", body)
 
     async def status(self) -> StatusResponse:
-        url = f"{self.host}/status/?" + urlencode({ "key": self.key })
-        async for _ in async_sleeper(
-            linear_throttle(max_attempts=self.get_max_attempts)
-        ):
-            status_request = await self._request_raw("GET", url)
-            if self._should_retry(status_request):
+        cached = self._cached_status()
+        if cached is not None:
+            return cached
+        return await self._fetch_status()
+
+    def _revalidate_status(self) -> None:
+        import asyncio
+
+        if self._status_refresh is not None and not self._status_refresh.done():
+            return
+
+        def done(task: "asyncio.Task[StatusResponse]") -> None:
+            if not task.cancelled() and task.exception() is not None:
+                error = task.exception()
+                logger.warning("Background status refresh failed: %s", error)
+
+        self._status_refresh = asyncio.ensure_future(self._fetch_status())
+        self._status_refresh.add_done_callback(done)
+
+    async def _fetch_status(self) -> StatusResponse:
+        attempts = _Attempts(self.retry)
+        throttle = linear_throttle(max_attempts=self.get_max_attempts)
+        async for _ in async_sleeper(attempts.delays(throttle)):
+            host = self._pick_host()
+            status_request = await self._send(host, "GET", self._status_url(host))
+            if attempts.retry(self._retry_cause(status_request)):
                 continue
             assert status_request.body is not None
-            return typing.cast(StatusResponse, status_request.body)
+            status = typing.cast(StatusResponse, status_request.body)
+            self._status_cache = (time.monotonic(), status)
+            return status
 
         raise RuntimeError(
             _error_message.format("get status", self.get_max_attempts, "get")
@@ -448,15 +976,16 @@ class AsyncAPIClient(APIClientMixin):
     async def recognize_hcaptcha(
         self, task: str, images: typing.List[str]
     ) -> RecognitionResponse:
-        for image in images:
-            validate_image(image)
+        validate_images(images)
+        # a copy owned by the client, compact clients empty it once submitted
+        images = _Payload(images)
 
         body: ImageRecognitionRequest = {
             "type": "hcaptcha",
             "task": task,
             "image_data": images,
         }
-        return typing.cast(RecognitionResponse, await self.recognize_raw(body))
+        return typing.cast(RecognitionResponse, await self._recognize_images(body))
 
     async def recognize_hcaptcha_area_select(
         self,
@@ -503,18 +1032,18 @@ class AsyncAPIClient(APIClientMixin):
     async def recognize_recaptcha(
         self, task: str, images: typing.List[str]
     ) -> RecognitionResponse:
-        for image in images:
-            validate_image(image)
+        validate_images(images)
+        images = _Payload(images)
 
-        if not 9 >= len(images) >= 1:
-            raise ValueError("recaptcha requires 1-9 images")
+        if not images:
+            raise ValueError("recaptcha requires at least 1 image")
 
         body: ImageRecognitionRequest = {
             "type": "recaptcha",
             "task": task,
             "image_data": images,
         }
-        return typing.cast(RecognitionResponse, await self.recognize_raw(body))
+        return typing.cast(RecognitionResponse, await self._recognize_images(body))
 
     async def recognize_funcaptcha(self, task: str, image: str) -> RecognitionResponse:
         validate_image(image)
@@ -522,9 +1051,9 @@ class AsyncAPIClient(APIClientMixin):
         body: ImageRecognitionRequest = {
             "type": "funcaptcha",
             "task": task,
-            "image_data": [image],
+            "image_data": _Payload([image]),
         }
-        return typing.cast(RecognitionResponse, await self.recognize_raw(body))
+        return typing.cast(RecognitionResponse, await self._recognize_images(body))
 
     async def recognize_awscaptcha(self, audio: str) -> RecognitionResponse:
         validate_image(audio)
@@ -541,7 +1070,7 @@ class AsyncAPIClient(APIClientMixin):
         url: str,
         *,
         enterprise: bool = False,
-        proxy: typing.Optional[Proxy] = None,
+        proxy: typing.Union[Proxy, ProxyPool, None] = None,
         useragent: typing.Optional[str] = None,
         rqdata: typing.Optional[str] = None,
     ) -> TokenResponse:
@@ -571,7 +1100,7 @@ class AsyncAPIClient(APIClientMixin):
         url: str,
         *,
         enterprise: bool = False,
-        proxy: typing.Optional[Proxy] = None,
+        proxy: typing.Union[Proxy, ProxyPool, None] = None,
         useragent: typing.Optional[str] = None,
         sdata: typing.Optional[str] = None,
     ) -> TokenResponse:
@@ -601,7 +1130,7 @@ class AsyncAPIClient(APIClientMixin):
         url: str,
         *,
         enterprise: bool = False,
-        proxy: typing.Optional[Proxy] = None,
+        proxy: typing.Union[Proxy, ProxyPool, None] = None,
         useragent: typing.Optional[str] = None,
         action: typing.Optional[str] = None,
     ) -> TokenResponse:
@@ -630,7 +1159,7 @@ class AsyncAPIClient(APIClientMixin):
         sitekey: str,
         url: str,
         *,
-        proxy: typing.Optional[Proxy] = None,
+        proxy: typing.Union[Proxy, ProxyPool, None] = None,
         useragent: typing.Optional[str] = None,
         action: typing.Optional[str] = None,
         cdata: typing.Optional[str] = None,
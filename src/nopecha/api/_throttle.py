@@ -13,9 +13,14 @@ async for _ in async_sleeper(throttle()):
 
 """
 
-import asyncio
 import time
 import typing
+from contextvars import ContextVar
+
+from .cancel import _cancel_token
+
+# multiplier for every throttle sleep, replay clients lower it to compress time
+_time_scale: ContextVar[float] = ContextVar("nopecha_time_scale", default=1.0)
 
 
 def linear_throttle(*, factor: float = 1, max_sleep: float = 60, max_attempts: int = 0):
@@ -35,10 +40,24 @@ def exp_throttle(*, base: float = 1.54, max_sleep: float = 60, max_attempts: int
 
 
 def sleeper(gen: typing.Generator[float, None, None]):
+    token = _cancel_token.get()
     for delay in gen:
-        yield time.sleep(delay)
+        delay *= _time_scale.get()
+        if token is not None:
+            # wakes up, and raises, as soon as the token is cancelled
+            token.sleep(delay)
+        elif delay > 0:
+            time.sleep(delay)
+        yield
 
 
 async def async_sleeper(gen: typing.Generator[float, None, None]):
+    import asyncio
+
+    token = _cancel_token.get()
     for delay in gen:
-        yield await asyncio.sleep(delay)
+        # always await, even for 0, so other tasks get a turn
+        await asyncio.sleep(delay * _time_scale.get())
+        if token is not None:
+            token.raise_if_cancelled()
+        yield
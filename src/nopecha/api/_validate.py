@@ -10,3 +10,8 @@ def validate_image(image):
 def validate_audio(audio):
     if not validate_not_url(audio):
         raise ValueError("audio must be a base64 encoded audio")
+
+
+def validate_images(images):
+    for image in images:
+        validate_image(image)
@@ -1,8 +1,6 @@
 import typing
 from logging import getLogger
 
-from aiohttp import ClientSession
-
 try:
     import aiohttp
 except ImportError:
@@ -11,27 +9,110 @@ except ImportError:
 from ._base import AsyncAPIClient, UniformResponse
 
 logger = getLogger(__name__)
-__all__ = ["AsyncHTTPXAPIClient"]
+__all__ = ["AiohttpAPIClient", "AsyncHTTPXAPIClient"]
 
 
-class AsyncHTTPXAPIClient(AsyncAPIClient):
-    client: aiohttp.ClientSession
+class _Session:
+    """The session of a client, shared with its `with_key` views."""
 
-    def __init__(self, *args, client: ClientSession, **kwargs):
-        super().__init__(*args, **kwargs)
+    __slots__ = ("client",)
 
+    def __init__(self, client: typing.Optional[aiohttp.ClientSession]):
         self.client = client
 
+
+class AiohttpAPIClient(AsyncAPIClient):
+    """
+    aiohttp backed client.
+
+    Either pass your own `client` session, or let the client own one:
+
+        async with AiohttpAPIClient("YOUR_API_KEY") as api:
+            await api.solve_hcaptcha(...)
+
+    An owned session uses a connector tuned for many concurrent solves
+    against a single host, and is closed when the context exits. Outside of
+    `async with`, the session is created on first use and you must call
+    `close()` when done. Views from `with_key` share the session, even one
+    they create first, and closing a view leaves it open.
+    """
+
+    _instance_local = AsyncAPIClient._instance_local + ("_owns_client",)
+    _owns_client = False
+
+    def __init__(
+        self,
+        *args,
+        client: typing.Optional[aiohttp.ClientSession] = None,
+        limit_per_host: int = 100,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 30,
+        warmup_connections: int = 0,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+
+        self._session = _Session(client)
+        self._owns_client = client is None
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.warmup_connections = warmup_connections
+
+    @property
+    def client(self) -> typing.Optional[aiohttp.ClientSession]:
+        return self._session.client
+
+    @client.setter
+    def client(self, client: typing.Optional[aiohttp.ClientSession]) -> None:
+        self._session.client = client
+
+    async def __aenter__(self) -> "AiohttpAPIClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit_per_host,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        return aiohttp.ClientSession(connector=connector)
+
+    async def open(self) -> None:
+        if self.client is None:
+            self.client = self._create_session()
+
+        if self.warmup_connections > 0:
+            await self.warmup(self.warmup_connections)
+
+    async def close(self) -> None:
+        await self.stop_keepalive()
+        if self._owns_client and self.client is not None:
+            await self.client.close()
+            self.client = None
+
     async def _request_raw(
         self, method: str, url: str, body: typing.Optional[dict] = None
     ) -> UniformResponse:
+        if self.client is None:
+            self.client = self._create_session()
+
         status = 999
         try:
             async with self.client.request(
                 method, url, json=body, headers=self._get_headers()
             ) as response:
                 status = response.status
-                return UniformResponse(status, await response.json())
+                return UniformResponse(status, await response.json(content_type=None))
         except Exception as e:
             logger.warning("Request failed: %s", e)
             return UniformResponse(status, None)
+
+
+# kept for backwards compatibility, this module used to name its client this way
+AsyncHTTPXAPIClient = AiohttpAPIClient
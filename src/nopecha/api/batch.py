@@ -0,0 +1,294 @@
+"""
+Bulk solving of a JSONL file of requests.
+
+    python -m nopecha batch requests.jsonl -o results.jsonl --workers 4
+
+Every input line is a `RecognitionRequest`, or a `TokenRequest` when it has a
+`sitekey`. Lines are sharded over `workers` processes, each running an async
+client with up to `concurrency` solves in flight. Results are appended to the
+output as they complete, one line each:
+
+    {"line": 3, "result": {...}}
+    {"line": 4, "error": "..."}
+
+The output doubles as the checkpoint: when it already exists, lines that have
+a result in it are skipped, so an interrupted run continues where it stopped.
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import typing
+
+__all__ = ["run", "main"]
+
+# (line number, result or None, error or None, latency in seconds)
+_Outcome = typing.Tuple[int, typing.Any, typing.Optional[str], float]
+
+_DONE = None  # sent by a worker once its shard is finished
+
+
+def _completed(output: str) -> typing.Set[int]:
+    done: typing.Set[int] = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # cut short by an interruption
+            if "result" in record:
+                done.add(record["line"])
+    return done
+
+
+def _end_last_line(output: str) -> None:
+    # a line cut short by an interruption must not swallow the next record
+    if not os.path.exists(output) or os.path.getsize(output) == 0:
+        return
+    with open(output, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def _lines(
+    path: str, skip: typing.Set[int]
+) -> typing.Iterator[typing.Tuple[int, str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f):
+            if number not in skip and line.strip():
+                yield number, line
+
+
+def _shard(
+    path: str, worker: int, workers: int, skip: typing.Set[int]
+) -> typing.Iterator[typing.Tuple[int, str]]:
+    for number, line in _lines(path, skip):
+        if number % workers == worker:
+            yield number, line
+
+
+def _parse(line: str) -> dict:
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(request, dict):
+        raise ValueError("Request must be a JSON object")
+    return request
+
+
+async def _solve_shard(
+    path: str,
+    worker: int,
+    workers: int,
+    skip: typing.Set[int],
+    concurrency: int,
+    client_options: dict,
+    results: "multiprocessing.Queue[typing.Optional[_Outcome]]",
+) -> None:
+    from . import create_client
+
+    client = typing.cast(typing.Any, create_client(mode="async", **client_options))
+    slots = asyncio.Semaphore(concurrency)
+
+    async def solve(number: int, request: dict) -> None:
+        start = time.monotonic()
+        try:
+            if "sitekey" in request:
+                result = await client.solve_raw(request)
+            else:
+                result = await client.recognize_raw(request)
+            outcome: _Outcome = (number, result, None, time.monotonic() - start)
+        except Exception as e:
+            outcome = (number, None, str(e), time.monotonic() - start)
+        finally:
+            slots.release()
+        results.put(outcome)
+
+    tasks = set()
+    try:
+        for number, line in _shard(path, worker, workers, skip):
+            try:
+                request = _parse(line)
+            except ValueError as e:
+                results.put((number, None, str(e), 0.0))
+                continue
+            # reading stops while every slot is taken, so memory stays flat
+            await slots.acquire()
+            task = asyncio.ensure_future(solve(number, request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+    finally:
+        close = getattr(client, "close", None)
+        if close is not None:
+            await close()
+        results.put(_DONE)
+
+
+def _worker(*args: typing.Any) -> None:
+    try:
+        asyncio.run(_solve_shard(*args))
+    except KeyboardInterrupt:
+        pass
+
+
+class _Progress:
+    def __init__(self, total_done: int, stream: typing.Optional[typing.TextIO]):
+        self.stream = stream
+        self.start = time.monotonic()
+        self.resumed = total_done
+        self.solved = 0
+        self.failed = 0
+        self.latencies: typing.Deque[float] = collections.deque(maxlen=10_000)
+        self._printed = 0.0
+
+    def add(self, failed: bool, latency: float) -> None:
+        if failed:
+            self.failed += 1
+        else:
+            self.solved += 1
+        self.latencies.append(latency)
+
+    def line(self) -> str:
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        rate = (self.solved + self.failed) / elapsed
+        summary = (
+            f"[NopeCHA] {self.solved} solved, {self.failed} failed, "
+            f"{self.resumed} resumed, {rate:.1f}/s"
+        )
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            p50 = ordered[len(ordered) // 2]
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            summary += f", latency p50 {p50:.2f}s p95 {p95:.2f}s"
+        return summary
+
+    def show(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if self.stream is None:
+            return
+        if force or now - self._printed >= 1:
+            self._printed = now
+            self.stream.write("\r" + self.line())
+            self.stream.flush()
+
+
+def _write(
+    out: typing.TextIO, number: int, result: typing.Any, error: typing.Optional[str]
+) -> None:
+    record = { "line": number }
+    if error is None:
+        record["result"] = result
+    else:
+        record["error"] = error
+    # flushed line by line, the file is also the checkpoint
+    out.write(json.dumps(record, default=dict) + "\n")
+    out.flush()
+
+
+def run(
+    input: str,
+    output: str,
+    *,
+    workers: int = 1,
+    concurrency: int = 16,
+    progress: typing.Optional[typing.TextIO] = sys.stderr,
+    **client_options: typing.Any,
+) -> typing.Tuple[int, int]:
+    """
+    Solve every request in `input`, appending results to `output`. Extra
+    keyword arguments are passed to the async client of every worker.
+    Returns the number of solved and failed requests.
+    """
+    if workers < 1 or concurrency < 1:
+        raise ValueError("workers and concurrency must be at least 1")
+
+    done = _completed(output)
+    _end_last_line(output)
+    stats = _Progress(len(done), progress)
+    results: "multiprocessing.Queue[typing.Optional[_Outcome]]" = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=_worker,
+            args=(input, worker, workers, done, concurrency, client_options, results),
+            name=f"nopecha-batch-{worker}",
+            daemon=True,
+        )
+        for worker in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    running = workers
+    reported: typing.Set[int] = set()
+    try:
+        with open(output, "a", encoding="utf-8") as out:
+            while running:
+                try:
+                    outcome = results.get(timeout=1)
+                except queue.Empty:
+                    if not any(p.is_alive() for p in processes):
+                        break  # a worker died without reporting
+                    stats.show()
+                    continue
+                if outcome is _DONE:
+                    running -= 1
+                    continue
+
+                number, result, error, latency = outcome
+                reported.add(number)
+                _write(out, number, result, error)
+                stats.add(error is not None, latency)
+                stats.show()
+
+            # lines of a worker that crashed or stopped early were never solved
+            for number, _ in _lines(input, done):
+                if number not in reported:
+                    _write(out, number, None, "Worker exited before solving this line")
+                    stats.add(True, 0.0)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        if progress is not None:
+            stats.show(force=True)
+            progress.write("\n")
+
+    return stats.solved, stats.failed
+
+
+def main(argv: typing.Optional[typing.Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m nopecha batch",
+        description="Solve a JSONL file of recognition or token requests.",
+    )
+    parser.add_argument("input", help="JSONL file, one request per line")
+    parser.add_argument("-o", "--output", required=True, help="JSONL results, also used to resume")
+    parser.add_argument("--key", default=os.environ.get("NOPECHA_API_KEY"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--concurrency", type=int, default=16, help="solves in flight per worker")
+    args = parser.parse_args(argv)
+
+    try:
+        solved, failed = run(
+            args.input,
+            args.output,
+            workers=args.workers,
+            concurrency=args.concurrency,
+            key=args.key,
+        )
+    except KeyboardInterrupt:
+        print("[NopeCHA] Interrupted, run the same command again to resume", file=sys.stderr)
+        sys.exit(130)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,142 @@
+"""
+Credit budget guard for clients.
+
+The budget knows the account's credit from `status()` (refreshed every
+`refresh_interval` seconds) and counts credits spent locally in between. Once
+the estimate drops to `reserve`, submissions fail with `BudgetExceeded`
+without any network call until the quota is due to reset.
+
+With `rate` set, spending is also limited to `rate` credits per second (with
+bursts up to `burst`). Submissions over the rate wait up to `max_wait`
+seconds for credit to free up, or fail with `BudgetExceeded`.
+
+Usage:
+
+budget = Budget(reserve=100, rate=5, max_wait=30)
+client = RequestsAPIClient("YOUR_API_KEY", budget=budget)
+"""
+
+import math
+import threading
+import time
+import typing
+
+from .types import StatusResponse
+
+__all__ = ["Budget", "BudgetExceeded"]
+
+
+class BudgetExceeded(RuntimeError):
+    pass
+
+
+class Budget:
+    def __init__(
+        self,
+        *,
+        reserve: int = 0,
+        rate: typing.Optional[float] = None,
+        burst: typing.Optional[float] = None,
+        max_wait: float = 0,
+        refresh_interval: float = 60,
+        cost: typing.Union[int, typing.Callable[[typing.Any], int]] = 1,
+    ):
+        self.reserve = reserve
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate or 0, 1)
+        self.max_wait = max_wait
+        self.refresh_interval = refresh_interval
+        self.cost = cost
+
+        self._lock = threading.Lock()
+        self._credit: typing.Optional[int] = None
+        self._used = 0
+        self._refreshed = -math.inf
+        self._reset_at: typing.Optional[float] = None
+        self._tokens = self.burst
+        self._filled = time.monotonic()
+
+    @property
+    def remaining(self) -> typing.Optional[int]:
+        """Estimated credit left, or None before the first status refresh."""
+        with self._lock:
+            return self._remaining()
+
+    def _remaining(self) -> typing.Optional[int]:
+        return None if self._credit is None else self._credit - self._used
+
+    def _exhausted(self, cost: int = 0) -> bool:
+        remaining = self._remaining()
+        return remaining is not None and remaining - cost < self.reserve
+
+    def needs_refresh(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            resets_later = self._reset_at is not None and now < self._reset_at
+            if self._exhausted() and resets_later:
+                # no point asking the server before the quota resets
+                return False
+            return now - self._refreshed >= self.refresh_interval
+
+    def update(self, status: StatusResponse) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._refreshed = now
+            credit = status.get("credit")
+            if not isinstance(credit, int):
+                # an error response, keep whatever we knew before
+                return
+            self._credit = credit
+            self._used = 0
+            ttl = status.get("ttl")
+            self._reset_at = now + ttl if isinstance(ttl, int) and ttl > 0 else None
+
+    def cost_of(self, body: typing.Any) -> int:
+        return self.cost(body) if callable(self.cost) else self.cost
+
+    def take(self, cost: int) -> float:
+        """
+        Reserve `cost` credits, returns the number of seconds to wait before
+        spending them. Callers over the rate queue up: every reservation is
+        taken from the bucket at once, so a later caller waits behind the
+        earlier ones. Raises `BudgetExceeded` when the credit is used up, the
+        wait would exceed `max_wait`, or `cost` is more than `burst` and could
+        never be reserved. Give unspent credits back with `refund`.
+        """
+        with self._lock:
+            if self._exhausted(cost):
+                raise BudgetExceeded(
+                    f"credit budget exhausted ({self._remaining()} left, "
+                    f"{self.reserve} reserved)"
+                )
+
+            delay = 0.0
+            if self.rate:
+                if cost > self.burst:
+                    # the bucket never holds this much, waiting cannot help
+                    raise BudgetExceeded(
+                        f"a cost of {cost} credits exceeds the burst of {self.burst}"
+                    )
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._filled) * self.rate
+                )
+                self._filled = now
+                # goes negative while callers are queued, the debt is paid
+                # back by the refill before the last of them may spend
+                delay = max(0.0, (cost - self._tokens) / self.rate)
+                if delay > self.max_wait:
+                    raise BudgetExceeded(
+                        f"spend rate of {self.rate} credits/s exceeded"
+                    )
+                self._tokens -= cost
+
+            self._used += cost
+            return delay
+
+    def refund(self, cost: int) -> None:
+        """Give back credits reserved for a submission that was not accepted."""
+        with self._lock:
+            self._used -= cost
+            if self.rate:
+                self._tokens = min(self.burst, self._tokens + cost)
@@ -0,0 +1,94 @@
+"""
+Cooperative cancellation for sync calls.
+
+Calls made inside `cancellable(token)` stop as soon as `token.cancel()` is
+called from any thread: retry and poll sleeps wake up at once, a call waiting
+for a scheduler slot gives up its place in the queue, and `Cancelled` is
+raised. A request already on the wire is not interrupted, the call stops
+right after it returns.
+
+Async calls are cancelled the usual way, by cancelling their task. Either
+way, scheduler slots, budget reservations and proxy leases are released, and
+the id of a job that was accepted but not polled to the end is recorded in
+the client's `abandoned_jobs`.
+
+Usage:
+
+token = CancelToken()
+with cancellable(token):
+    client.solve_hcaptcha(...)  # raises Cancelled once token.cancel() is called
+"""
+
+import threading
+import time
+import typing
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+__all__ = ["Cancelled", "CancelToken", "cancellable"]
+
+
+class Cancelled(Exception):
+    pass
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: typing.List[typing.Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise Cancelled("call was cancelled")
+
+    def sleep(self, delay: float) -> None:
+        """Sleep for `delay` seconds, raise `Cancelled` as soon as cancelled."""
+        if self._event.wait(delay):
+            raise Cancelled("call was cancelled")
+
+    def _add_callback(self, callback: typing.Callable[[], None]) -> None:
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def _remove_callback(self, callback: typing.Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+_cancel_token: ContextVar[typing.Optional[CancelToken]] = ContextVar(
+    "nopecha_cancel_token", default=None
+)
+
+
+@contextmanager
+def cancellable(token: CancelToken):
+    """Make calls inside the block, in this thread or task, stop on `token`."""
+    reset = _cancel_token.set(token)
+    try:
+        yield token
+    finally:
+        _cancel_token.reset(reset)
+
+
+def _sleep(delay: float) -> None:
+    token = _cancel_token.get()
+    if token is None:
+        time.sleep(delay)
+    else:
+        token.sleep(delay)
@@ -0,0 +1,87 @@
+"""
+Splitting of large image recognitions into jobs the server accepts.
+
+Image lists longer than the client's `image_batch_limits` entry for their
+captcha type are split into chunks, which are submitted concurrently. The
+per-image answers are merged back in the original order, so the caller sees
+one response and latency is bounded by the slowest chunk.
+
+When some chunks fail, `PartialRecognitionError` is raised once, carrying the
+answers that did arrive and the error of every failed chunk.
+"""
+
+import typing
+from collections.abc import Mapping
+
+from .cancel import Cancelled
+from .compact import _Payload
+from .types import ImageRecognitionRequest, RecognitionResponse
+
+__all__ = ["PartialRecognitionError", "DEFAULT_IMAGE_BATCH_LIMITS"]
+
+# most images per job, by captcha type
+DEFAULT_IMAGE_BATCH_LIMITS: typing.Dict[str, int] = {
+    "recaptcha": 9,
+    "hcaptcha": 9,
+}
+
+
+class PartialRecognitionError(RuntimeError):
+    def __init__(
+        self,
+        data: typing.List[typing.Any],
+        errors: typing.List[typing.Tuple[int, BaseException]],
+    ):
+        """
+        `data` has the answer of every image, None where its chunk failed.
+        `errors` pairs the index of each failed chunk's first image with the
+        error it raised.
+        """
+        self.data = data
+        self.errors = errors
+        failed = sum(answer is None for answer in data)
+        super().__init__(
+            f"{failed} of {len(data)} images were not recognized, "
+            f"first error: {errors[0][1]}"
+        )
+
+
+def split(
+    body: ImageRecognitionRequest, limit: typing.Optional[int]
+) -> typing.List[ImageRecognitionRequest]:
+    images = body["image_data"]
+    if not limit or len(images) <= limit:
+        return [body]
+    return [
+        { **body, "image_data": _Payload(images[start : start + limit]) }
+        for start in range(0, len(images), limit)
+    ]
+
+
+def merge(
+    sizes: typing.List[int],
+    outcomes: typing.Sequence[typing.Union[RecognitionResponse, BaseException]],
+) -> RecognitionResponse:
+    for outcome in outcomes:
+        # a cancelled chunk cancels the whole call, it is not a partial failure
+        if isinstance(outcome, Cancelled):
+            raise outcome
+        if not isinstance(outcome, (Mapping, Exception)):
+            raise typing.cast(BaseException, outcome)
+
+    data: typing.List[typing.Any] = []
+    errors: typing.List[typing.Tuple[int, BaseException]] = []
+    for size, outcome in zip(sizes, outcomes):
+        answers = outcome.get("data") if isinstance(outcome, Mapping) else None
+        if isinstance(outcome, BaseException):
+            errors.append((len(data), outcome))
+            answers = None
+        elif not isinstance(answers, list) or len(answers) != size:
+            error = RuntimeError(f"Expected {size} answers, server returned: {outcome}")
+            errors.append((len(data), error))
+            answers = None
+        data.extend(answers if answers is not None else [None] * size)
+
+    if errors:
+        raise PartialRecognitionError(data, errors)
+    return typing.cast(RecognitionResponse, { "data": data })
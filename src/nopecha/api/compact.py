@@ -0,0 +1,61 @@
+"""
+Compact responses and request payloads for clients with many solves in flight.
+
+Clients created with `compact=True`
+
+- return a `Result` for every solve and recognition instead of a dict. It
+  keeps the response's `data` in a single slot, and still reads like the
+  response dict: `result["data"]`, `result.get("data")` and `dict(result)`
+  all work. Other keys of the response are dropped. `status()` still returns
+  a dict.
+- let go of image payloads as soon as the server accepts a job. The images
+  given to `recognize_hcaptcha`, `recognize_recaptcha` and
+  `recognize_funcaptcha` are copied into a list owned by the client, and that
+  list is emptied right after the POST. While the job is polled, the images
+  are only kept alive by references the caller holds.
+
+Usage:
+
+client = AiohttpAPIClient("YOUR_API_KEY", compact=True)
+result = await client.recognize_hcaptcha(task, images)
+print(result.data)
+"""
+
+import typing
+from collections.abc import Mapping
+
+__all__ = ["Result"]
+
+
+class Result(Mapping):
+    __slots__ = ("data",)
+
+    def __init__(self, data: typing.Any):
+        self.data = data
+
+    def __getitem__(self, key: str) -> typing.Any:
+        if key != "data":
+            raise KeyError(key)
+        return self.data
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(("data",))
+
+    def __len__(self) -> int:
+        return 1
+
+    def __repr__(self) -> str:
+        return f"Result(data={self.data!r})"
+
+
+class _Payload(list):
+    """Images owned by the client, emptied by `_release` once submitted."""
+
+    __slots__ = ()
+
+
+def _release(body: dict) -> None:
+    # only lists the client made itself, never the caller's own objects
+    for value in body.values():
+        if isinstance(value, _Payload):
+            value.clear()
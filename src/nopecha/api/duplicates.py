@@ -0,0 +1,267 @@
+"""
+Near-duplicate lookup for recognition images.
+
+Captcha images come back often, but rarely byte for byte: they are
+re-encoded, cropped by a pixel or two, or have noise added. The index keeps a
+perceptual hash (dHash, 64 bits) of every image the API has answered, in a
+BK-tree per captcha type and task. Images within `threshold` bits of a known
+one reuse its answer, and only the remaining images are sent to the API. When
+every image of a request is known, no request is made at all.
+
+Requires Pillow (`pip install nopecha[duplicates]`).
+
+Usage:
+
+index = NearDuplicateIndex(threshold=4)
+client = RequestsAPIClient("YOUR_API_KEY", duplicates=index)
+client.recognize_hcaptcha(task, images)
+print(index.stats())
+"""
+
+import base64
+import binascii
+import collections
+import io
+import threading
+import typing
+from collections.abc import Mapping
+
+try:
+    from PIL import Image
+except ImportError:
+    raise ImportError("You must install 'Pillow' to use `nopecha.api.duplicates`")
+
+from .compact import _Payload
+from .types import ImageRecognitionRequest, RecognitionResponse
+
+__all__ = ["NearDuplicateIndex", "DuplicateStats", "image_hash"]
+
+# captcha types whose answer is about the request as a whole rather than a
+# list with one entry per image
+_WHOLE_ANSWER = ("funcaptcha",)
+
+if hasattr(int, "bit_count"):
+
+    def _distance(a: int, b: int) -> int:
+        return (a ^ b).bit_count()
+
+else:  # python < 3.10
+
+    def _distance(a: int, b: int) -> int:
+        return bin(a ^ b).count("1")
+
+
+def image_hash(image: str) -> int:
+    """
+    64 bit difference hash of a base64 encoded image: whether each pixel of a
+    9x8 grayscale thumbnail is brighter than its right neighbour.
+    """
+    if image.startswith("data:"):
+        image = image.partition(",")[2]
+    with Image.open(io.BytesIO(base64.b64decode(image))) as decoded:
+        thumbnail = decoded.convert("L").resize((9, 8), Image.BILINEAR)
+    pixels = thumbnail.tobytes()  # one byte per pixel in mode "L"
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def _hashes(images: typing.Sequence[str]) -> typing.List[typing.Optional[int]]:
+    hashes: typing.List[typing.Optional[int]] = []
+    for image in images:
+        try:
+            hashes.append(image_hash(image))
+        except (OSError, ValueError, binascii.Error):
+            hashes.append(None)  # not an image Pillow can read, always ask
+    return hashes
+
+
+class _BKTree:
+    """Hamming distance BK-tree. Nodes are [hash, answer, {distance: node}]."""
+
+    __slots__ = ("root", "size")
+
+    def __init__(self):
+        self.root: typing.Optional[list] = None
+        self.size = 0
+
+    def add(self, key: int, answer: typing.Any) -> None:
+        if self.root is None:
+            self.root = [key, answer, {}]
+            self.size += 1
+            return
+        node = self.root
+        while True:
+            distance = _distance(key, node[0])
+            if distance == 0:
+                node[1] = answer  # newest answer wins
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, answer, {}]
+                self.size += 1
+                return
+            node = child
+
+    def nearest(
+        self, key: int, threshold: int
+    ) -> typing.Optional[typing.Tuple[int, typing.Any]]:
+        best: typing.Optional[typing.Tuple[int, typing.Any]] = None
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = _distance(key, node[0])
+            if distance <= threshold and (best is None or distance < best[0]):
+                best = (distance, node[1])
+                if distance == 0:
+                    break
+            # triangle inequality: only these subtrees can hold a match
+            low, high = distance - threshold, distance + threshold
+            stack.extend(
+                child for d, child in node[2].items() if low <= d <= high
+            )
+        return best
+
+
+class DuplicateStats(typing.NamedTuple):
+    images: int
+    hits: int
+    requests_saved: int
+    entries: int
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.images if self.images else 0.0
+
+
+class _Lookup:
+    """Answers found for the images of one request, None where unknown."""
+
+    __slots__ = ("index", "tree_key", "hashes", "answers")
+
+    def __init__(
+        self,
+        index: "NearDuplicateIndex",
+        tree_key: typing.Tuple[str, str],
+        hashes: typing.List[typing.Optional[int]],
+        answers: typing.List[typing.Any],
+    ):
+        self.index = index
+        self.tree_key = tree_key
+        self.hashes = hashes
+        self.answers = answers
+
+    @property
+    def complete(self) -> bool:
+        return all(answer is not None for answer in self.answers)
+
+    def _misses(self) -> typing.List[int]:
+        return [i for i, answer in enumerate(self.answers) if answer is None]
+
+    def response(self) -> RecognitionResponse:
+        if self.tree_key[0] in _WHOLE_ANSWER:
+            return typing.cast(RecognitionResponse, { "data": self.answers[0] })
+        return typing.cast(RecognitionResponse, { "data": list(self.answers) })
+
+    def remaining(self, body: ImageRecognitionRequest) -> ImageRecognitionRequest:
+        """`body` with only the images that still need the API."""
+        images = body["image_data"]
+        return { **body, "image_data": _Payload(images[i] for i in self._misses()) }
+
+    def merge(self, response: typing.Any) -> typing.Any:
+        """Combine the API's answers for the remaining images with ours."""
+        data = response.get("data") if isinstance(response, Mapping) else None
+        misses = self._misses()
+        if self.tree_key[0] in _WHOLE_ANSWER:
+            if data is not None:
+                self.index._learn(self.tree_key, self.hashes[0], data)
+            return response
+        if not isinstance(data, list) or len(data) != len(misses):
+            return response  # not shaped like we expect, do not learn from it
+
+        answers = list(self.answers)
+        for i, answer in zip(misses, data):
+            answers[i] = answer
+            self.index._learn(self.tree_key, self.hashes[i], answer)
+        return { **response, "data": answers }
+
+
+class NearDuplicateIndex:
+    def __init__(self, *, threshold: int = 4, max_entries: int = 100_000):
+        """
+        `threshold` is the largest number of differing hash bits (out of 64)
+        for two images to count as the same. Once `max_entries` images are
+        known, the oldest half is forgotten.
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._trees: typing.Dict[typing.Tuple[str, str], _BKTree] = {}
+        # insertion order, to rebuild the trees without the oldest entries
+        self._entries: typing.Deque[
+            typing.Tuple[typing.Tuple[str, str], int, typing.Any]
+        ] = collections.deque()
+        self._lock = threading.Lock()
+        self._images = 0
+        self._hits = 0
+        self._requests_saved = 0
+
+    def lookup(
+        self,
+        body: ImageRecognitionRequest,
+        hashes: typing.Optional[typing.List[typing.Optional[int]]] = None,
+    ) -> _Lookup:
+        """
+        Find known answers for the images of `body`. Async clients hash the
+        images in an executor and pass the `hashes`, so that decoding them
+        does not block the event loop.
+        """
+        tree_key = (body["type"], body["task"])
+        if hashes is None:
+            hashes = _hashes(body["image_data"])
+
+        answers: typing.List[typing.Any] = []
+        with self._lock:
+            tree = self._trees.get(tree_key)
+            for key in hashes:
+                match = None
+                if tree is not None and key is not None:
+                    match = tree.nearest(key, self.threshold)
+                answers.append(None if match is None else match[1])
+
+            self._images += len(answers)
+            self._hits += sum(answer is not None for answer in answers)
+            lookup = _Lookup(self, tree_key, hashes, answers)
+            if lookup.complete:
+                self._requests_saved += 1
+        return lookup
+
+    def _learn(
+        self, tree_key: typing.Tuple[str, str], key: typing.Optional[int], answer: typing.Any
+    ) -> None:
+        if key is None or answer is None:
+            return
+        with self._lock:
+            self._trees.setdefault(tree_key, _BKTree()).add(key, answer)
+            self._entries.append((tree_key, key, answer))
+            if len(self._entries) > self.max_entries:
+                self._forget_oldest()
+
+    def _forget_oldest(self) -> None:
+        for _ in range(len(self._entries) // 2):
+            self._entries.popleft()
+        self._trees = {}
+        for tree_key, key, answer in self._entries:
+            self._trees.setdefault(tree_key, _BKTree()).add(key, answer)
+
+    def stats(self) -> DuplicateStats:
+        with self._lock:
+            return DuplicateStats(
+                images=self._images,
+                hits=self._hits,
+                requests_saved=self._requests_saved,
+                entries=sum(tree.size for tree in self._trees.values()),
+            )
@@ -0,0 +1,182 @@
+"""
+Latency based selection and failover between several API hosts.
+
+Clients given `hosts=[...]` keep an `EndpointPool`. Every request feeds the
+pool its round trip time and whether the host answered. New jobs go to the
+healthy host with the lowest error-weighted RTT, polls stay on the host that
+accepted the job. A submission that fails on one host is retried on another
+healthy host right away, the usual backoff only applies once none is left.
+
+Each host has a circuit breaker: after `failure_threshold` failures in a row
+it opens and the host is skipped for `open_for` seconds, after which a single
+trial request decides whether it closes again. If every circuit is open the
+host that will reopen first is used rather than stalling.
+"""
+
+import random
+import threading
+import time
+import typing
+
+__all__ = ["EndpointPool", "EndpointStats"]
+
+
+class EndpointStats(typing.NamedTuple):
+    host: str
+    state: typing.Literal["closed", "open", "half-open"]
+    rtt: typing.Optional[float]
+    error_rate: float
+    requests: int
+    errors: int
+
+
+class _Endpoint:
+    __slots__ = (
+        "host",
+        "rtt",
+        "error_rate",
+        "requests",
+        "errors",
+        "consecutive_failures",
+        "open_until",
+        "trial_in_flight",
+    )
+
+    def __init__(self, host: str):
+        self.host = host
+        self.rtt: typing.Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.open_until: typing.Optional[float] = None
+        self.trial_in_flight = False
+
+
+def _score(endpoint: _Endpoint) -> float:
+    # unmeasured hosts sort first so they get measured
+    return (endpoint.rtt or 0.0) * (1 + 4 * endpoint.error_rate)
+
+
+class EndpointPool:
+    def __init__(
+        self,
+        hosts: typing.Sequence[str],
+        *,
+        failure_threshold: int = 3,
+        open_for: float = 30,
+        smoothing: float = 0.2,
+        explore: float = 0.05,
+    ):
+        """
+        `smoothing` is the weight of the newest request in the moving
+        averages, `explore` the share of submissions sent to a random healthy
+        host so that the RTT of every host stays current.
+        """
+        if not hosts:
+            raise ValueError("EndpointPool needs at least one host")
+        self._endpoints = {
+            host.rstrip("/"): _Endpoint(host.rstrip("/")) for host in hosts
+        }
+        self.failure_threshold = failure_threshold
+        self.open_for = open_for
+        self.smoothing = smoothing
+        self.explore = explore
+        self._lock = threading.Lock()
+
+    @property
+    def hosts(self) -> typing.List[str]:
+        return list(self._endpoints)
+
+    def _state(
+        self, endpoint: _Endpoint, now: float
+    ) -> typing.Literal["closed", "open", "half-open"]:
+        if endpoint.open_until is None:
+            return "closed"
+        if now < endpoint.open_until:
+            return "open"
+        return "half-open"
+
+    def choose(self) -> str:
+        with self._lock:
+            now = time.monotonic()
+            closed, trials = [], []
+            for endpoint in self._endpoints.values():
+                state = self._state(endpoint, now)
+                if state == "closed":
+                    closed.append(endpoint)
+                elif state == "half-open" and not endpoint.trial_in_flight:
+                    trials.append(endpoint)
+
+            if trials:
+                # probe a recovering host with a single request
+                trials[0].trial_in_flight = True
+                return trials[0].host
+            if not closed:
+                return min(
+                    self._endpoints.values(), key=lambda e: e.open_until or 0
+                ).host
+            if len(closed) > 1 and random.random() < self.explore:
+                return random.choice(closed).host
+
+            return min(closed, key=_score).host
+
+    def alternative(self, host: str) -> typing.Optional[str]:
+        """The best closed host other than `host`, None when there is none."""
+        with self._lock:
+            now = time.monotonic()
+            closed = [
+                endpoint
+                for endpoint in self._endpoints.values()
+                if endpoint.host != host.rstrip("/")
+                and self._state(endpoint, now) == "closed"
+            ]
+            return min(closed, key=_score).host if closed else None
+
+    def record(self, host: str, ok: bool, rtt: float) -> None:
+        with self._lock:
+            endpoint = self._endpoints.get(host.rstrip("/"))
+            if endpoint is None:
+                return
+            alpha = self.smoothing
+            endpoint.requests += 1
+            endpoint.error_rate += alpha * (float(not ok) - endpoint.error_rate)
+            endpoint.trial_in_flight = False
+
+            if ok:
+                if endpoint.rtt is None:
+                    endpoint.rtt = rtt
+                else:
+                    endpoint.rtt += alpha * (rtt - endpoint.rtt)
+                endpoint.consecutive_failures = 0
+                endpoint.open_until = None
+                return
+
+            endpoint.errors += 1
+            endpoint.consecutive_failures += 1
+            now = time.monotonic()
+            half_open = self._state(endpoint, now) == "half-open"
+            if half_open or endpoint.consecutive_failures >= self.failure_threshold:
+                endpoint.open_until = now + self.open_for
+
+    def abandon(self, host: str) -> None:
+        """Forget a request that was cancelled before it finished."""
+        with self._lock:
+            endpoint = self._endpoints.get(host.rstrip("/"))
+            if endpoint is not None:
+                endpoint.trial_in_flight = False
+
+    def stats(self) -> typing.List[EndpointStats]:
+        with self._lock:
+            now = time.monotonic()
+            return [
+                EndpointStats(
+                    host=endpoint.host,
+                    state=self._state(endpoint, now),
+                    rtt=endpoint.rtt,
+                    error_rate=endpoint.error_rate,
+                    requests=endpoint.requests,
+                    errors=endpoint.errors,
+                )
+                for endpoint in self._endpoints.values()
+            ]
@@ -0,0 +1,526 @@
+"""
+Local gateway that lets many processes share one client.
+
+Every worker process normally owns a client, with its own connection pool,
+retry loops and view of the rate limit. The gateway runs a single async client
+instead, and local processes send it whole operations over a Unix socket (or a
+localhost TCP port). All solves then share one warm pool, one poller, and the
+gateway's scheduler and budget.
+
+Start the gateway:
+
+    python -m nopecha gateway --key YOUR_API_KEY --max-concurrent 64
+
+And use it from any process like a regular client:
+
+client = GatewayAPIClient()
+client.solve_hcaptcha(sitekey, url)
+
+The protocol is one JSON object per line, each carrying an `id` so that a
+single connection can have many operations in flight.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import typing
+from concurrent.futures import CancelledError, Future
+from logging import getLogger
+
+from ._base import APIClient, AsyncAPIClient, UniformResponse
+from .budget import BudgetExceeded
+from .cancel import Cancelled, _cancel_token
+from .retry import RetryBudgetExceeded
+from .scheduler import DeadlineExceeded, Priority, _job_options, job
+from .types import StatusResponse
+
+logger = getLogger(__name__)
+__all__ = [
+    "DEFAULT_SOCKET",
+    "Gateway",
+    "GatewayAPIClient",
+    "AsyncGatewayAPIClient",
+]
+
+# a unix socket path, or a (host, port) pair for tcp
+Address = typing.Union[str, typing.Tuple[str, int]]
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "nopecha-gateway.sock")
+
+# requests carry base64 images, allow much longer lines than asyncio's 64 KiB
+_MAX_MESSAGE = 64 * 1024 * 1024
+
+_PATHS = ("/", "/token/")
+
+# errors that keep their type across the socket, everything else arrives as
+# RuntimeError
+_ERRORS: typing.Dict[str, typing.Type[Exception]] = {
+    "BudgetExceeded": BudgetExceeded,
+    "DeadlineExceeded": DeadlineExceeded,
+    "RetryBudgetExceeded": RetryBudgetExceeded,
+    "ValueError": ValueError,
+    "Cancelled": Cancelled,
+}
+
+_LOST = { "error": "Lost connection to the gateway" }
+
+
+def _encode(message: dict) -> bytes:
+    # default=dict turns compact `Result`s back into plain objects
+    encoded = json.dumps(message, separators=(",", ":"), default=dict)
+    return encoded.encode("utf-8") + b"\n"
+
+
+def _result(reply: dict) -> typing.Any:
+    if "error" in reply:
+        error = _ERRORS.get(reply.get("type", ""), RuntimeError)
+        raise error(reply["error"])
+    return reply["result"]
+
+
+def _job_fields() -> dict:
+    # deadlines travel as seconds left, monotonic clocks are per process
+    options = _job_options.get()
+    fields: typing.Dict[str, typing.Any] = { "priority": int(options.priority) }
+    if options.deadline is not None:
+        fields["deadline"] = options.deadline - time.monotonic()
+    return fields
+
+
+class Gateway:
+    def __init__(self, client: AsyncAPIClient):
+        """
+        Serve operations through `client`. Callers using another key get a
+        `with_key` view of it, so they still share its pool.
+        """
+        self.client = client
+        self.callers = 0
+        self._views: typing.Dict[str, AsyncAPIClient] = {}
+        self._server: typing.Optional[asyncio.AbstractServer] = None
+
+    async def start(self, address: Address = DEFAULT_SOCKET) -> "Gateway":
+        if isinstance(address, str):
+            _claim_socket(address)
+            self._server = await asyncio.start_unix_server(
+                self._handle, path=address, limit=_MAX_MESSAGE
+            )
+        else:
+            host, port = address
+            self._server = await asyncio.start_server(
+                self._handle, host, port, limit=_MAX_MESSAGE
+            )
+        return self
+
+    async def serve_forever(self) -> None:
+        assert self._server is not None, "call start() first"
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _client_for(self, key: typing.Optional[str]) -> AsyncAPIClient:
+        if key is None or key == self.client.key:
+            return self.client
+        view = self._views.get(key)
+        if view is None:
+            view = self._views[key] = self.client.with_key(key)
+        return view
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.callers += 1
+        write_lock = asyncio.Lock()
+        # message id -> task serving it
+        running: typing.Dict[typing.Any, "asyncio.Task[None]"] = {}
+        try:
+            async for line in reader:
+                try:
+                    message = json.loads(line)
+                except ValueError as e:
+                    message = { "op": "invalid", "error": str(e) }
+
+                if message.get("op") == "cancel":
+                    # the caller gave up, stop polling for it right away
+                    task = running.get(message.get("target"))
+                    if task is not None:
+                        task.cancel()
+                    continue
+
+                message_id = message.get("id")
+                task = asyncio.ensure_future(self._serve(message, writer, write_lock))
+                running[message_id] = task
+                task.add_done_callback(lambda _, i=message_id: running.pop(i, None))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            # the caller went away, nobody is waiting for these anymore
+            for task in list(running.values()):
+                task.cancel()
+            self.callers -= 1
+            writer.close()
+
+    async def _serve(
+        self, message: dict, writer: asyncio.StreamWriter, write_lock: asyncio.Lock
+    ) -> None:
+        reply: typing.Dict[str, typing.Any] = { "id": message.get("id") }
+        try:
+            reply["result"] = await self._dispatch(message)
+        except Exception as e:
+            reply["error"] = str(e)
+            reply["type"] = type(e).__name__
+
+        async with write_lock:
+            writer.write(_encode(reply))
+            await writer.drain()
+
+    async def _dispatch(self, message: dict) -> typing.Any:
+        client = self._client_for(message.get("key"))
+        op = message.get("op")
+        if op == "request":
+            path = message.get("path")
+            if path not in _PATHS:
+                raise ValueError(f"Unknown path {path!r}")
+            priority = Priority(message.get("priority", Priority.NORMAL))
+            with job(priority, message.get("deadline")):
+                return await client._request(path, message["body"])
+        elif op == "status":
+            return await client.status()
+        elif op == "ping":
+            return await client._ping()
+        elif op == "invalid":
+            raise ValueError(f"Invalid message: {message['error']}")
+        raise ValueError(f"Unknown gateway operation {op!r}")
+
+
+def _claim_socket(path: str) -> None:
+    # a socket file left behind by a gateway that died is removed, a live
+    # gateway is left alone
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise RuntimeError(f"A gateway is already listening on {path}")
+    finally:
+        probe.close()
+
+
+def _connect(address: Address) -> socket.socket:
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+    except OSError as e:
+        sock.close()
+        raise RuntimeError(f"Could not reach the gateway at {address}: {e}") from e
+    return sock
+
+
+class _Connection:
+    """
+    Socket to the gateway, shared by every thread of a client and by its
+    `with_key` views. Reconnects on the next call after the socket is lost.
+    """
+
+    def __init__(self, address: Address):
+        self.address = address
+        self._sock: typing.Optional[socket.socket] = None
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        # message id -> (socket it was sent on, future for the reply)
+        self._pending: typing.Dict[int, typing.Tuple[socket.socket, "Future[dict]"]] = {}
+        self._ids = itertools.count()
+
+    def _socket(self) -> socket.socket:
+        with self._lock:
+            if self._sock is None:
+                self._sock = _connect(self.address)
+                threading.Thread(
+                    target=self._read, args=(self._sock,), name="nopecha-gateway", daemon=True
+                ).start()
+            return self._sock
+
+    def call(self, message: dict) -> typing.Any:
+        sock = self._socket()
+        future: "Future[dict]" = Future()
+        message_id = next(self._ids)
+        with self._lock:
+            if self._sock is not sock:
+                # lost while we were connecting, the reader will not answer
+                raise RuntimeError(_LOST["error"])
+            self._pending[message_id] = (sock, future)
+        try:
+            with self._send_lock:
+                sock.sendall(_encode({ **message, "id": message_id }))
+        except OSError:
+            self._drop(sock)
+        return _result(self._wait(sock, message_id, future))
+
+    def _wait(
+        self, sock: socket.socket, message_id: int, future: "Future[dict]"
+    ) -> dict:
+        token = _cancel_token.get()
+        if token is None:
+            return future.result()
+
+        token._add_callback(future.cancel)
+        try:
+            return future.result()
+        except CancelledError:
+            self._pending.pop(message_id, None)
+            try:
+                with self._send_lock:
+                    sock.sendall(_encode({ "op": "cancel", "target": message_id }))
+            except OSError:
+                pass
+            raise Cancelled("call was cancelled")
+        finally:
+            token._remove_callback(future.cancel)
+
+    def _read(self, sock: socket.socket) -> None:
+        try:
+            with sock.makefile("rb") as stream:
+                for line in stream:
+                    reply = json.loads(line)
+                    _, future = self._pending.pop(reply.get("id"), (None, None))
+                    if future is not None:
+                        future.set_result(reply)
+        except (OSError, ValueError) as e:
+            logger.warning("Gateway connection failed: %s", e)
+        finally:
+            self._drop(sock)
+
+    def _drop(self, sock: socket.socket) -> None:
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+            lost = [i for i, (s, _) in self._pending.items() if s is sock]
+            futures = [self._pending.pop(i)[1] for i in lost]
+        try:
+            sock.close()
+        except OSError:
+            pass
+        for future in futures:
+            if not future.done():
+                future.set_result(_LOST)
+
+    def close(self) -> None:
+        with self._lock:
+            sock = self._sock
+        if sock is not None:
+            self._drop(sock)
+
+
+class _AsyncConnection:
+    """Async version of `_Connection`, bound to the loop it was first used in."""
+
+    def __init__(self, address: Address):
+        self.address = address
+        self._writer: typing.Optional[asyncio.StreamWriter] = None
+        self._reader_task: typing.Optional["asyncio.Task[None]"] = None
+        self._pending: typing.Dict[int, "asyncio.Future[dict]"] = {}
+        self._ids = itertools.count()
+        self._lock: typing.Optional[asyncio.Lock] = None
+
+    async def _stream(self) -> asyncio.StreamWriter:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._writer is None:
+                try:
+                    if isinstance(self.address, str):
+                        reader, writer = await asyncio.open_unix_connection(
+                            self.address, limit=_MAX_MESSAGE
+                        )
+                    else:
+                        reader, writer = await asyncio.open_connection(
+                            *self.address, limit=_MAX_MESSAGE
+                        )
+                except OSError as e:
+                    raise RuntimeError(
+                        f"Could not reach the gateway at {self.address}: {e}"
+                    ) from e
+                self._writer = writer
+                self._reader_task = asyncio.ensure_future(self._read(reader, writer))
+            return self._writer
+
+    async def _read(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            async for line in reader:
+                reply = json.loads(line)
+                future = self._pending.pop(reply.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        except (OSError, ValueError) as e:
+            logger.warning("Gateway connection failed: %s", e)
+        finally:
+            writer.close()
+            if self._writer is writer:
+                self._writer = None
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_result(_LOST)
+
+    async def call(self, message: dict) -> typing.Any:
+        writer = await self._stream()
+        future: "asyncio.Future[dict]" = asyncio.get_event_loop().create_future()
+        message_id = next(self._ids)
+        self._pending[message_id] = future
+        try:
+            writer.write(_encode({ **message, "id": message_id }))
+            await writer.drain()
+            return _result(await future)
+        except asyncio.CancelledError:
+            if not writer.is_closing():
+                writer.write(_encode({ "op": "cancel", "target": message_id }))
+            raise
+        finally:
+            self._pending.pop(message_id, None)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+            self._reader_task = None
+
+
+class GatewayAPIClient(APIClient):
+    """
+    Thin client that forwards every operation to a running `Gateway`.
+
+    Retries, polling, scheduling and budgets happen in the gateway, so the
+    `scheduler` and `budget` options of this client are not used. A `Proxy`
+    works as usual, a `ProxyPool` is leased locally. Safe to share between
+    threads, all of them use one socket.
+    """
+
+    def __init__(self, *args, address: Address = DEFAULT_SOCKET, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.address = address
+        self._connection = _Connection(address)
+
+    def _call(self, message: dict) -> typing.Any:
+        return self._connection.call({ **message, "key": self.key })
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _request(self, path: str, body: typing.Any) -> typing.Any:
+        message = { "op": "request", "path": path, "body": body, **_job_fields() }
+        return self._response(self._call(message))
+
+    def _fetch_status(self) -> StatusResponse:
+        status = self._call({ "op": "status" })
+        self._status_cache = (time.monotonic(), status)
+        return status
+
+    def _ping(self) -> bool:
+        return bool(self._call({ "op": "ping" }))
+
+    def _request_raw(
+        self, method: str, url: str, body: typing.Optional[dict] = None
+    ) -> UniformResponse:
+        raise NotImplementedError("GatewayAPIClient sends whole operations instead")
+
+
+class AsyncGatewayAPIClient(AsyncAPIClient):
+    """Async version of `GatewayAPIClient`."""
+
+    def __init__(self, *args, address: Address = DEFAULT_SOCKET, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.address = address
+        self._connection = _AsyncConnection(address)
+
+    async def _call(self, message: dict) -> typing.Any:
+        return await self._connection.call({ **message, "key": self.key })
+
+    async def close(self) -> None:
+        await self._connection.close()
+
+    async def _request(self, path: str, body: typing.Any) -> typing.Any:
+        message = { "op": "request", "path": path, "body": body, **_job_fields() }
+        return self._response(await self._call(message))
+
+    async def _fetch_status(self) -> StatusResponse:
+        status = await self._call({ "op": "status" })
+        self._status_cache = (time.monotonic(), status)
+        return status
+
+    async def _ping(self) -> bool:
+        return bool(await self._call({ "op": "ping" }))
+
+    async def _request_raw(
+        self, method: str, url: str, body: typing.Optional[dict] = None
+    ) -> UniformResponse:
+        raise NotImplementedError("AsyncGatewayAPIClient sends whole operations instead")
+
+
+async def _run(args: argparse.Namespace) -> None:
+    from . import create_client
+    from .scheduler import AsyncScheduler
+
+    options: typing.Dict[str, typing.Any] = {}
+    if args.max_concurrent:
+        options["scheduler"] = AsyncScheduler(max_concurrent=args.max_concurrent)
+    if args.status_ttl:
+        options["status_ttl"] = args.status_ttl
+    client = typing.cast(AsyncAPIClient, create_client(args.key, "async", **options))
+
+    address: Address = ("127.0.0.1", args.port) if args.port else args.socket
+    gateway = await Gateway(client).start(address)
+    if args.warmup:
+        await client.warmup(args.warmup)
+    client.start_keepalive()
+    print(f"[NopeCHA] Gateway listening on {address}")
+    try:
+        await gateway.serve_forever()
+    finally:
+        await gateway.close()
+        await client.stop_keepalive()
+        close = getattr(client, "close", None)
+        if close is not None:
+            await close()
+        else:
+            await client.client.aclose()  # type: ignore[attr-defined]
+
+
+def main(argv: typing.Optional[typing.Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m nopecha gateway",
+        description="Share one NopeCHA client between local processes.",
+    )
+    parser.add_argument("--key", default=os.environ.get("NOPECHA_API_KEY"))
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="unix socket path")
+    parser.add_argument("--port", type=int, help="listen on localhost tcp instead")
+    parser.add_argument("--max-concurrent", type=int, default=0)
+    parser.add_argument("--status-ttl", type=float, default=0)
+    parser.add_argument("--warmup", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
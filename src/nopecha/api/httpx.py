@@ -11,16 +11,49 @@ from ._base import APIClient, AsyncAPIClient, UniformResponse
 logger = getLogger(__name__)
 __all__ = ["HTTPXAPIClient", "AsyncHTTPXAPIClient"]
 
+# Pool limits for http2=True.
+#
+# - max_connections stays at httpx's default of 100. Over http/2 one
+#   connection carries every request, but hosts and proxies that only speak
+#   http/1.1 still need one connection per request in flight.
+# - keep-alive is raised from httpx's 20 connections for 5 seconds, so a
+#   burst of solves finds warm connections.
+# - max_keepalive_connections must stay below max_connections. When the two
+#   are equal and every connection is kept alive, requests queued beyond the
+#   cap stall.
+DEFAULT_HTTP2_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=50,
+    keepalive_expiry=60,
+)
+
+
+def _client_options(
+    http2: bool, limits: typing.Optional[httpx.Limits], http1: bool = True
+) -> dict:
+    if not http1 and not http2:
+        raise ValueError("At least one of http1 and http2 must be enabled")
+    options: typing.Dict[str, typing.Any] = { "http1": http1, "http2": http2 }
+    if limits is not None:
+        options["limits"] = limits
+    elif http2:
+        options["limits"] = DEFAULT_HTTP2_LIMITS
+    return options
+
 
 class HTTPXAPIClient(APIClient):
     client: httpx.Client
 
     def __init__(self, *args, **kwargs):
         client = kwargs.pop("client", None)
+        http1 = kwargs.pop("http1", True)
+        http2 = kwargs.pop("http2", False)
+        limits = kwargs.pop("limits", None)
         super().__init__(*args, **kwargs)
 
         if client is None:
-            client = httpx.Client()
+            # http2 requires the 'h2' package (`pip install httpx[http2]`)
+            client = httpx.Client(**_client_options(http2, limits, http1))
         elif isinstance(client, httpx.AsyncClient):
             raise TypeError(
                 "Expected httpx.Client, got httpx.AsyncClient. Use `nopecha.api.httpx.AsyncHTTPXAPIClient` for async usage instead."
@@ -47,10 +80,14 @@ class AsyncHTTPXAPIClient(AsyncAPIClient):
 
     def __init__(self, *args, **kwargs):
         client = kwargs.pop("client", None)
+        http1 = kwargs.pop("http1", True)
+        http2 = kwargs.pop("http2", False)
+        limits = kwargs.pop("limits", None)
         super().__init__(*args, **kwargs)
 
         if client is None:
-            client = httpx.AsyncClient()
+            # http2 requires the 'h2' package (`pip install httpx[http2]`)
+            client = httpx.AsyncClient(**_client_options(http2, limits, http1))
         elif isinstance(client, httpx.Client):
             raise TypeError(
                 "Expected httpx.AsyncClient, got httpx.Client. Use `nopecha.api.httpx.HTTPXAPIClient` for sync usage instead."
@@ -0,0 +1,279 @@
+"""
+Health scored proxy pool for token solves.
+
+Pass a `ProxyPool` wherever a `Proxy` is accepted. Each solve leases the
+proxy with the best score, the score being its recent success rate divided by
+its recent solve latency, dampened by a penalty that every failure adds to and
+that decays over time. Proxies at `max_concurrent` in-flight solves are
+skipped, callers wait when every proxy is busy.
+
+Usage:
+
+pool = ProxyPool([proxy_a, proxy_b, proxy_c], max_concurrent=4)
+client.solve_hcaptcha(sitekey, url, proxy=pool)
+
+for stats in pool.stats():
+    print(stats)
+"""
+
+import collections
+import threading
+import time
+import typing
+from contextlib import asynccontextmanager, contextmanager
+
+from .cancel import Cancelled, _cancel_token
+from .types import Proxy
+
+if typing.TYPE_CHECKING:
+    import asyncio
+
+__all__ = ["ProxyPool", "ProxyStats"]
+
+
+class ProxyStats(typing.NamedTuple):
+    proxy: Proxy
+    in_flight: int
+    successes: int
+    failures: int
+    success_rate: float
+    latency: typing.Optional[float]
+    penalty: float
+
+
+class _ProxyState:
+    __slots__ = (
+        "proxy",
+        "in_flight",
+        "successes",
+        "failures",
+        "success_rate",
+        "latency",
+        "penalty",
+        "penalized_at",
+    )
+
+    def __init__(self, proxy: Proxy):
+        self.proxy = proxy
+        self.in_flight = 0
+        self.successes = 0
+        self.failures = 0
+        self.success_rate = 1.0  # optimistic, so new proxies get tried
+        self.latency: typing.Optional[float] = None
+        self.penalty = 0.0
+        self.penalized_at = 0.0
+
+
+class ProxyPool:
+    def __init__(
+        self,
+        proxies: typing.Iterable[Proxy],
+        *,
+        max_concurrent: int = 4,
+        smoothing: float = 0.2,
+        penalty_half_life: float = 60,
+        wait_timeout: typing.Optional[float] = None,
+    ):
+        """
+        `smoothing` is the weight of the newest solve in the moving averages,
+        `penalty_half_life` is how many seconds it takes a failure penalty to
+        halve, and `wait_timeout` bounds how long a caller waits for a free
+        proxy before `RuntimeError` is raised.
+        """
+        self._states = [_ProxyState(proxy) for proxy in proxies]
+        if not self._states:
+            raise ValueError("ProxyPool needs at least one proxy")
+        self.max_concurrent = max_concurrent
+        self.smoothing = smoothing
+        self.penalty_half_life = penalty_half_life
+        self.wait_timeout = wait_timeout
+        self._condition = threading.Condition()
+        # async callers waiting for a proxy, in arrival order
+        self._waiters: typing.Deque[
+            typing.Tuple["asyncio.AbstractEventLoop", "asyncio.Future[_ProxyState]"]
+        ] = collections.deque()
+
+    def _penalty(self, state: _ProxyState, now: float) -> float:
+        elapsed = now - state.penalized_at
+        return state.penalty * 0.5 ** (elapsed / self.penalty_half_life)
+
+    def _score(self, state: _ProxyState, now: float, typical_latency: float) -> float:
+        latency = state.latency if state.latency is not None else typical_latency
+        health = state.success_rate / (1 + self._penalty(state, now))
+        return health / max(latency, 1e-3)
+
+    def _try_acquire(self) -> typing.Optional[_ProxyState]:
+        now = time.monotonic()
+        latencies = [s.latency for s in self._states if s.latency is not None]
+        typical_latency = sum(latencies) / len(latencies) if latencies else 1.0
+
+        best = None
+        best_score = -1.0
+        for state in self._states:
+            if state.in_flight >= self.max_concurrent:
+                continue
+            score = self._score(state, now, typical_latency)
+            if score > best_score:
+                best, best_score = state, score
+        if best is not None:
+            best.in_flight += 1
+        return best
+
+    def _release(
+        self, state: _ProxyState, success: typing.Optional[bool], latency: float
+    ) -> None:
+        with self._condition:
+            state.in_flight -= 1
+            if success is not None:
+                now = time.monotonic()
+                alpha = self.smoothing
+                state.success_rate += alpha * (float(success) - state.success_rate)
+                if success:
+                    state.successes += 1
+                    if state.latency is None:
+                        state.latency = latency
+                    else:
+                        state.latency += alpha * (latency - state.latency)
+                else:
+                    state.failures += 1
+                    state.penalty = self._penalty(state, now) + 1
+                    state.penalized_at = now
+            if not self._hand_off():
+                self._condition.notify()
+
+    def _hand_off(self) -> bool:
+        # lease the freed proxy to the longest waiting async caller, on its
+        # own loop, so callers are served in arrival order
+        while self._waiters:
+            loop, future = self._waiters.popleft()
+            if future.done():
+                continue
+            state = self._try_acquire()
+            if state is None:
+                self._waiters.appendleft((loop, future))
+                return False
+            try:
+                loop.call_soon_threadsafe(self._resolve, future, state)
+            except RuntimeError:
+                # the loop is closed, nobody is left to take the proxy
+                state.in_flight -= 1
+                continue
+            return True
+        return False
+
+    def _resolve(
+        self, future: "asyncio.Future[_ProxyState]", state: _ProxyState
+    ) -> None:
+        if future.done():
+            # the caller gave up in the meantime, pass the proxy on
+            self._release(state, None, 0.0)
+        else:
+            future.set_result(state)
+
+    def _no_proxy(self) -> RuntimeError:
+        return RuntimeError(
+            f"No proxy became available within {self.wait_timeout} seconds"
+        )
+
+    @contextmanager
+    def lease(self, neutral: typing.Tuple[typing.Type[BaseException], ...] = ()):
+        """
+        Lease the best available proxy for the duration of the block. The
+        outcome is recorded when the block exits: an exception counts as a
+        failure, unless it is one of `neutral` or not an `Exception`.
+        """
+        deadline = None
+        if self.wait_timeout is not None:
+            deadline = time.monotonic() + self.wait_timeout
+
+        def wake() -> None:
+            with self._condition:
+                self._condition.notify_all()
+
+        # cancelling the call wakes it up if it is waiting for a proxy
+        token = _cancel_token.get()
+        if token is not None:
+            token._add_callback(wake)
+        try:
+            with self._condition:
+                while True:
+                    if token is not None and token.cancelled:
+                        raise Cancelled("call was cancelled while waiting for a proxy")
+                    state = self._try_acquire()
+                    if state is not None:
+                        break
+                    timeout = None
+                    if deadline is not None:
+                        timeout = deadline - time.monotonic()
+                        if timeout <= 0:
+                            raise self._no_proxy()
+                    self._condition.wait(timeout)
+        finally:
+            if token is not None:
+                token._remove_callback(wake)
+
+        with self._outcome(state, neutral):
+            yield state.proxy
+
+    @asynccontextmanager
+    async def async_lease(
+        self, neutral: typing.Tuple[typing.Type[BaseException], ...] = ()
+    ):
+        """Async version of `lease`, waits for a free proxy without blocking."""
+        import asyncio
+
+        with self._condition:
+            # queue behind earlier callers rather than overtaking them
+            state = None if self._waiters else self._try_acquire()
+            if state is None:
+                loop = asyncio.get_running_loop()
+                waiter = (loop, loop.create_future())
+                self._waiters.append(waiter)
+
+        if state is None:
+            try:
+                state = await asyncio.wait_for(waiter[1], self.wait_timeout)
+            except asyncio.TimeoutError:
+                raise self._no_proxy() from None
+            finally:
+                with self._condition:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+
+        with self._outcome(state, neutral):
+            yield state.proxy
+
+    @contextmanager
+    def _outcome(
+        self,
+        state: _ProxyState,
+        neutral: typing.Tuple[typing.Type[BaseException], ...],
+    ):
+        start = time.monotonic()
+        success: typing.Optional[bool] = None
+        try:
+            yield
+            success = True
+        except neutral:
+            raise
+        except Exception:
+            success = False
+            raise
+        finally:
+            self._release(state, success, time.monotonic() - start)
+
+    def stats(self) -> typing.List[ProxyStats]:
+        with self._condition:
+            now = time.monotonic()
+            return [
+                ProxyStats(
+                    proxy=state.proxy,
+                    in_flight=state.in_flight,
+                    successes=state.successes,
+                    failures=state.failures,
+                    success_rate=state.success_rate,
+                    latency=state.latency,
+                    penalty=self._penalty(state, now),
+                )
+                for state in self._states
+            ]
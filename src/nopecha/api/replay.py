@@ -0,0 +1,320 @@
+"""
+Record real API traffic once, then replay it without the network.
+
+`record` captures every response a client receives, including 429s and
+`IncompleteJob` polls, together with its latency. The replay clients serve
+those responses back to any number of solves, so the CPU and allocation cost
+of the client itself can be profiled in isolation.
+
+`time_scale` multiplies both the recorded latencies and the throttle sleeps
+between retries and polls: 1 replays in real time, 0 (the default) as fast as
+possible.
+
+Usage:
+
+with record(client, "solves.jsonl.gz"):
+    client.solve_hcaptcha(sitekey, url)
+
+replay = ReplayAPIClient(recording="solves.jsonl.gz")
+for _ in range(100_000):
+    replay.solve_hcaptcha(sitekey, url)
+
+Files are JSON lines, gzip compressed when the name ends in `.gz`. They hold
+paths, job ids and response bodies, never the API key.
+"""
+
+import gzip
+import inspect
+import itertools
+import json
+import threading
+import time
+import typing
+from contextlib import contextmanager
+from urllib.parse import unquote_plus, urlsplit
+
+from ._base import APIClient, APIClientMixin, AsyncAPIClient, UniformResponse
+from ._throttle import _time_scale
+from .types import StatusResponse
+
+__all__ = [
+    "Exchange",
+    "Recording",
+    "record",
+    "ReplayAPIClient",
+    "AsyncReplayAPIClient",
+]
+
+
+class Exchange(typing.NamedTuple):
+    method: str
+    path: str
+    job_id: typing.Optional[str]
+    status_code: int
+    body: typing.Optional[dict]
+    latency: float
+
+
+def _open(path: str, mode: str) -> typing.IO[str]:
+    if path.endswith(".gz"):
+        return typing.cast(typing.IO[str], gzip.open(path, mode + "t", encoding="utf-8"))
+    return open(path, mode, encoding="utf-8")
+
+
+def _job_id(url: str) -> typing.Optional[str]:
+    # polls end in `&id=...`, a full parse_qs would dominate replay profiles
+    _, found, job_id = url.rpartition("&id=")
+    return unquote_plus(job_id) if found else None
+
+
+class Recording:
+    def __init__(self, exchanges: typing.Iterable[Exchange] = ()):
+        self.exchanges = list(exchanges)
+
+    def __len__(self) -> int:
+        return len(self.exchanges)
+
+    def add(
+        self, method: str, url: str, response: UniformResponse, latency: float
+    ) -> None:
+        self.exchanges.append(
+            Exchange(
+                method,
+                urlsplit(url).path,
+                _job_id(url),
+                response.status_code,
+                response.body,
+                latency,
+            )
+        )
+
+    def save(self, path: str) -> None:
+        with _open(path, "w") as f:
+            for exchange in self.exchanges:
+                f.write(json.dumps(exchange, separators=(",", ":")) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "Recording":
+        with _open(path, "r") as f:
+            return cls(Exchange(*json.loads(line)) for line in f if line.strip())
+
+
+class _Recorder:
+    __slots__ = ("recording", "active")
+
+    def __init__(self, recording: Recording):
+        self.recording = recording
+        self.active = True
+
+
+def _install(client: APIClientMixin, recorder: _Recorder) -> None:
+    # bound to `client` itself, views get their own from `with_key`, and once
+    # the block is over the wrappers just pass calls through
+    cls = type(client)
+    request_raw = cls._request_raw  # type: ignore[attr-defined]
+
+    if inspect.iscoroutinefunction(request_raw):
+
+        async def recorded(method, url, body=None):
+            if not recorder.active:
+                return await request_raw(client, method, url, body)
+            start = time.perf_counter()
+            response = await request_raw(client, method, url, body)
+            recorder.recording.add(method, url, response, time.perf_counter() - start)
+            return response
+
+    else:
+
+        def recorded(method, url, body=None):
+            if not recorder.active:
+                return request_raw(client, method, url, body)
+            start = time.perf_counter()
+            response = request_raw(client, method, url, body)
+            recorder.recording.add(method, url, response, time.perf_counter() - start)
+            return response
+
+    def with_key(key):
+        view = cls.with_key(client, key)
+        if recorder.active:
+            _install(view, recorder)
+        return view
+
+    client.__dict__["_request_raw"] = recorded
+    client.__dict__["with_key"] = with_key
+
+
+@contextmanager
+def record(
+    client: APIClientMixin, path: typing.Optional[str] = None
+) -> typing.Iterator[Recording]:
+    """
+    Record every response `client` receives inside the block, and save them
+    to `path` on exit. Works for sync and async clients, and for `with_key`
+    views created inside the block, each of which sends with its own key.
+    """
+    recorder = _Recorder(Recording())
+    _install(client, recorder)
+    try:
+        yield recorder.recording
+    finally:
+        recorder.active = False
+        del client.__dict__["_request_raw"]
+        del client.__dict__["with_key"]
+        if path is not None:
+            recorder.recording.save(path)
+
+
+class _Player:
+    """
+    Serves recorded responses. Submissions are served in recorded order,
+    wrapping around at the end, and every accepted job gets a fresh id whose
+    polls replay the polls recorded for the original job.
+    """
+
+    def __init__(self, recording: Recording):
+        # each submission with the polls recorded for its job, if accepted
+        self._submits: typing.List[
+            typing.Tuple[Exchange, typing.Optional[typing.List[Exchange]]]
+        ] = []
+        self._statuses: typing.List[Exchange] = []
+        polls: typing.Dict[str, typing.List[Exchange]] = {}
+
+        for exchange in recording.exchanges:
+            if exchange.method == "POST":
+                job_polls = None
+                if _accepted(exchange):
+                    assert exchange.body is not None
+                    job_polls = polls[str(exchange.body["data"])] = []
+                self._submits.append((exchange, job_polls))
+            elif exchange.job_id is not None:
+                polls.setdefault(exchange.job_id, []).append(exchange)
+            else:
+                self._statuses.append(exchange)
+
+        if not self._submits and not self._statuses:
+            raise ValueError("Recording contains no responses")
+        self._next_submit = itertools.cycle(self._submits)
+        self._next_status = itertools.cycle(self._statuses)
+        self._job_ids = itertools.count()
+        # replayed job id -> (recorded polls, index of the next one)
+        self._jobs: typing.Dict[str, typing.Tuple[typing.List[Exchange], int]] = {}
+        self._lock = threading.Lock()
+
+    def play(self, method: str, url: str) -> typing.Tuple[UniformResponse, float]:
+        with self._lock:
+            if method == "POST":
+                return self._submit(url)
+            exchange = self._poll(url)
+            return UniformResponse(exchange.status_code, exchange.body), exchange.latency
+
+    def _submit(self, url: str) -> typing.Tuple[UniformResponse, float]:
+        if not self._submits:
+            raise RuntimeError(f"Recording has no submissions to replay for {url}")
+        exchange, job_polls = next(self._next_submit)
+        body = exchange.body
+        if job_polls and body is not None:
+            job_id = f"replay-{next(self._job_ids)}"
+            self._jobs[job_id] = (job_polls, 0)
+            body = { **body, "data": job_id }
+        return UniformResponse(exchange.status_code, body), exchange.latency
+
+    def _poll(self, url: str) -> Exchange:
+
+        job_id = _job_id(url)
+        if job_id is None:
+            if self._statuses:
+                return next(self._next_status)
+            raise RuntimeError(f"Recording has no status responses to replay for {url}")
+
+        if job_id not in self._jobs:
+            raise RuntimeError(f"Recording has no polls to replay for {url}")
+        polls, index = self._jobs[job_id]
+        if index + 1 >= len(polls):
+            # last recorded poll, the job will not be polled again
+            del self._jobs[job_id]
+        else:
+            self._jobs[job_id] = (polls, index + 1)
+        return polls[index]
+
+
+def _accepted(exchange: Exchange) -> bool:
+    body = exchange.body
+    return exchange.status_code < 400 and body is not None and "data" in body
+
+
+def _player(recording: typing.Union[Recording, str]) -> _Player:
+    if isinstance(recording, str):
+        recording = Recording.load(recording)
+    return _Player(recording)
+
+
+class ReplayAPIClient(APIClient):
+    def __init__(
+        self,
+        *args,
+        recording: typing.Union[Recording, str],
+        time_scale: float = 0,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.time_scale = time_scale
+        self._player = _player(recording)
+
+    def _request(self, path: str, body: typing.Any) -> typing.Any:
+        token = _time_scale.set(self.time_scale)
+        try:
+            return super()._request(path, body)
+        finally:
+            _time_scale.reset(token)
+
+    def _fetch_status(self) -> StatusResponse:
+        token = _time_scale.set(self.time_scale)
+        try:
+            return super()._fetch_status()
+        finally:
+            _time_scale.reset(token)
+
+    def _request_raw(
+        self, method: str, url: str, body: typing.Optional[dict] = None
+    ) -> UniformResponse:
+        response, latency = self._player.play(method, url)
+        if latency * self.time_scale > 0:
+            time.sleep(latency * self.time_scale)
+        return response
+
+
+class AsyncReplayAPIClient(AsyncAPIClient):
+    def __init__(
+        self,
+        *args,
+        recording: typing.Union[Recording, str],
+        time_scale: float = 0,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.time_scale = time_scale
+        self._player = _player(recording)
+
+    async def _request(self, path: str, body: typing.Any) -> typing.Any:
+        token = _time_scale.set(self.time_scale)
+        try:
+            return await super()._request(path, body)
+        finally:
+            _time_scale.reset(token)
+
+    async def _fetch_status(self) -> StatusResponse:
+        token = _time_scale.set(self.time_scale)
+        try:
+            return await super()._fetch_status()
+        finally:
+            _time_scale.reset(token)
+
+    async def _request_raw(
+        self, method: str, url: str, body: typing.Optional[dict] = None
+    ) -> UniformResponse:
+        import asyncio
+
+        response, latency = self._player.play(method, url)
+        # always yield to the loop, so concurrent solves interleave
+        await asyncio.sleep(latency * self.time_scale)
+        return response
@@ -13,14 +13,38 @@ __all__ = ["RequestsAPIClient"]
 
 
 class RequestsAPIClient(APIClient):
+    """
+    requests backed client.
+
+    The client holds no per-call state, so one instance (and its connection
+    pool) can be shared between threads. Pass `pool_maxsize` to size the pool
+    for the number of threads, callers block when every connection is busy.
+    A `session` you pass in is used as it is, size its adapters yourself.
+    Use `with_key` to serve several api keys from the same pool.
+    """
+
     session: requests.Session
 
     def __init__(self, *args, **kwargs):
         session = kwargs.pop("session", None)
+        pool_maxsize = kwargs.pop("pool_maxsize", None)
         super().__init__(*args, **kwargs)
 
+        if session is not None and pool_maxsize is not None:
+            raise ValueError(
+                "pool_maxsize only applies to the client's own session, "
+                "mount an adapter on the session you pass instead"
+            )
         if session is None:
             session = requests.Session()
+        if pool_maxsize is not None:
+            # one pool per api host, so failover never evicts a warm pool
+            hosts = len(self.endpoints.hosts) if self.endpoints is not None else 1
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=hosts, pool_maxsize=pool_maxsize, pool_block=True
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
         self.session = session
 
     def _request_raw(
@@ -0,0 +1,182 @@
+"""
+Retry policy with decorrelated jitter and a client-wide retry budget.
+
+Without a policy, clients retry on fixed exponential and linear schedules,
+so after an outage every worker retries in lockstep. With one, each retry
+sleeps a random delay between `base` and three times the previous delay
+(decorrelated jitter, capped at `max_sleep`).
+
+Retries also draw from a budget shared by every call of the client. Each
+successful request adds `ratio` to it, each retry takes 1, and
+`min_per_second` is added over time so a quiet client can still retry. When
+the budget is empty, the failure is raised as `RetryBudgetExceeded` instead
+of being retried, so retries cannot multiply the load on a struggling server.
+
+Polls for unfinished jobs are not retries and keep their schedule.
+
+Usage:
+
+policy = RetryPolicy(ratio=0.1)
+client = RequestsAPIClient("YOUR_API_KEY", retry=policy)
+print(policy.stats())
+"""
+
+import random
+import threading
+import time
+import typing
+from enum import IntEnum
+
+if typing.TYPE_CHECKING:
+    from ._base import UniformResponse
+
+__all__ = [
+    "RetryCause",
+    "RetryPolicy",
+    "RetryStats",
+    "RetryBudgetExceeded",
+    "classify",
+]
+
+# status reported by the clients when no response arrived at all
+TRANSPORT_ERROR_STATUS = 999
+
+
+class RetryCause(IntEnum):
+    TRANSPORT = 0
+    SERVER_ERROR = 1
+    RATE_LIMITED = 2
+    EMPTY_BODY = 3
+
+
+class RetryBudgetExceeded(RuntimeError):
+    pass
+
+
+class RetryStats(typing.NamedTuple):
+    successes: int
+    retries: typing.Dict[RetryCause, int]
+    denied: typing.Dict[RetryCause, int]
+    budget: float
+
+
+def classify(response: "UniformResponse") -> typing.Optional[RetryCause]:
+    """Why `response` should be retried, or None when it should not be."""
+    if response.status_code == TRANSPORT_ERROR_STATUS:
+        return RetryCause.TRANSPORT
+    if response.status_code >= 500:
+        return RetryCause.SERVER_ERROR
+    if response.status_code == 429:
+        return RetryCause.RATE_LIMITED
+    if response.body is None:
+        return RetryCause.EMPTY_BODY
+    return None
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        *,
+        base: float = 0.5,
+        max_sleep: float = 60,
+        ratio: float = 0.2,
+        min_per_second: float = 1,
+        max_budget: float = 100,
+    ):
+        """
+        `base` is the shortest retry delay. `ratio` is how many retries each
+        successful request pays for, `min_per_second` how many are allowed
+        regardless, and `max_budget` caps the retries that can be saved up.
+        """
+        self.base = base
+        self.max_sleep = max_sleep
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_budget = max_budget
+
+        self._lock = threading.Lock()
+        self._budget = max_budget
+        self._filled = time.monotonic()
+        self._successes = 0
+        self._retries = { cause: 0 for cause in RetryCause }
+        self._denied = { cause: 0 for cause in RetryCause }
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._filled
+        self._filled = now
+        self._budget = min(self.max_budget, self._budget + elapsed * self.min_per_second)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._successes += 1
+            self._budget = min(self.max_budget, self._budget + self.ratio)
+
+    def allow(self, cause: RetryCause) -> bool:
+        """Take one retry from the budget, returns False when it is empty."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._budget < 1:
+                self._denied[cause] += 1
+                return False
+            self._budget -= 1
+            self._retries[cause] += 1
+            return True
+
+    def backoff(self, previous: float) -> float:
+        return min(self.max_sleep, random.uniform(self.base, max(previous, self.base) * 3))
+
+    def stats(self) -> RetryStats:
+        with self._lock:
+            self._refill(time.monotonic())
+            return RetryStats(
+                successes=self._successes,
+                retries=dict(self._retries),
+                denied=dict(self._denied),
+                budget=self._budget,
+            )
+
+
+class _Attempts:
+    """
+    Retry state of a single call. Wraps the call's throttle so that attempt
+    limits and poll delays are unchanged, and replaces the delay after a
+    retryable failure with the policy's backoff.
+
+    for _ in sleeper(attempts.delays(exp_throttle(max_attempts=10))):
+        response = ...
+        if attempts.retry(classify(response)):
+            continue
+    """
+
+    __slots__ = ("policy", "cause", "previous")
+
+    def __init__(self, policy: typing.Optional[RetryPolicy]):
+        self.policy = policy
+        self.cause: typing.Optional[RetryCause] = None
+        self.previous = 0.0
+
+    def delays(
+        self, throttle: typing.Generator[float, None, None]
+    ) -> typing.Generator[float, None, None]:
+        for delay in throttle:
+            if self.cause is not None and self.policy is not None:
+                delay = self.previous = self.policy.backoff(self.previous)
+            yield delay
+
+    def retry(self, cause: typing.Optional[RetryCause]) -> bool:
+        """
+        Record the outcome of an attempt. Returns True when it should be
+        retried, raises `RetryBudgetExceeded` when it should but the budget is
+        empty.
+        """
+        self.cause = cause
+        if self.policy is None:
+            return cause is not None
+        if cause is None:
+            self.policy.record_success()
+            return False
+        if not self.policy.allow(cause):
+            raise RetryBudgetExceeded(
+                f"Retry budget exhausted, not retrying after {cause.name.lower()}"
+            )
+        return True
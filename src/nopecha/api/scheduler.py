@@ -0,0 +1,287 @@
+"""
+Priority and deadline aware admission for job submissions.
+
+A scheduler hands out a fixed number of submission slots. Calls beyond that
+wait in a queue ordered by priority, then deadline, then arrival. Jobs whose
+deadline passes while they wait are dropped before they are submitted, so
+they never spend credits.
+
+Usage:
+
+scheduler = Scheduler(max_concurrent=8)
+client = RequestsAPIClient("YOUR_API_KEY", scheduler=scheduler)
+
+with job(Priority.URGENT, deadline=5):
+    client.solve_hcaptcha(...)
+
+print(scheduler.stats())
+
+Async clients take an `AsyncScheduler` instead, `job` works the same way
+since the options live in a context variable.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+import typing
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+
+from .cancel import Cancelled, _cancel_token
+
+__all__ = [
+    "Priority",
+    "DeadlineExceeded",
+    "SchedulerStats",
+    "Scheduler",
+    "AsyncScheduler",
+    "job",
+]
+
+
+class Priority(IntEnum):
+    URGENT = 0
+    NORMAL = 1
+    BACKGROUND = 2
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class SchedulerStats(typing.NamedTuple):
+    in_flight: int
+    queued: typing.Dict[Priority, int]
+    admitted: typing.Dict[Priority, int]
+    dropped: typing.Dict[Priority, int]
+    mean_wait: typing.Dict[Priority, float]
+    max_wait: typing.Dict[Priority, float]
+
+
+class _JobOptions(typing.NamedTuple):
+    priority: Priority
+    deadline: typing.Optional[float]  # time.monotonic() timestamp
+
+
+_job_options: ContextVar[_JobOptions] = ContextVar(
+    "nopecha_job_options", default=_JobOptions(Priority.NORMAL, None)
+)
+
+
+@contextmanager
+def job(
+    priority: Priority = Priority.NORMAL, deadline: typing.Optional[float] = None
+):
+    """
+    Set the priority and deadline (in seconds from now) for submissions made
+    inside the block, in this thread or task.
+    """
+    absolute = None if deadline is None else time.monotonic() + deadline
+    token = _job_options.set(_JobOptions(Priority(priority), absolute))
+    try:
+        yield
+    finally:
+        _job_options.reset(token)
+
+
+class _Waiter:
+    __slots__ = (
+        "priority",
+        "deadline",
+        "enqueued",
+        "admitted",
+        "abandoned",
+        "signal",
+    )
+
+    def __init__(self, options: _JobOptions, signal: typing.Any):
+        self.priority = options.priority
+        self.deadline = options.deadline
+        self.enqueued = time.monotonic()
+        self.admitted = False
+        self.abandoned = False
+        self.signal = signal
+
+    def expired(self, now: float) -> bool:
+        return self.deadline is not None and now >= self.deadline
+
+
+class _SchedulerBase:
+    def __init__(self, max_concurrent: int = 16):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.max_concurrent = max_concurrent
+        self._in_flight = 0
+        self._queue: typing.List[typing.Tuple[int, float, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._admitted = dict.fromkeys(Priority, 0)
+        self._dropped = dict.fromkeys(Priority, 0)
+        self._total_wait = dict.fromkeys(Priority, 0.0)
+        self._max_wait = dict.fromkeys(Priority, 0.0)
+
+    def _try_admit(self, options: _JobOptions) -> bool:
+        if options.deadline is not None and time.monotonic() >= options.deadline:
+            self._dropped[options.priority] += 1
+            raise DeadlineExceeded("job deadline passed before it was submitted")
+        if self._in_flight < self.max_concurrent and not self._queue:
+            self._in_flight += 1
+            self._admitted[options.priority] += 1
+            return True
+        return False
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        deadline = waiter.deadline if waiter.deadline is not None else float("inf")
+        entry = (waiter.priority, deadline, next(self._sequence), waiter)
+        heapq.heappush(self._queue, entry)
+
+    def _next_waiter(self) -> typing.Optional[_Waiter]:
+        """Release a slot and hand it to the best live waiter, if any."""
+        now = time.monotonic()
+        while self._queue:
+            waiter = heapq.heappop(self._queue)[3]
+            if waiter.abandoned:
+                continue
+            if waiter.expired(now):
+                waiter.abandoned = True
+                self._dropped[waiter.priority] += 1
+                self._wake(waiter)
+                continue
+            waiter.admitted = True
+            self._record_wait(waiter, now)
+            return waiter
+        self._in_flight -= 1
+        return None
+
+    def _record_wait(self, waiter: _Waiter, now: float) -> None:
+        wait = now - waiter.enqueued
+        self._admitted[waiter.priority] += 1
+        self._total_wait[waiter.priority] += wait
+        self._max_wait[waiter.priority] = max(self._max_wait[waiter.priority], wait)
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        waiter.abandoned = True
+        self._dropped[waiter.priority] += 1
+
+    def _wake(self, waiter: _Waiter) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> SchedulerStats:
+        queued = dict.fromkeys(Priority, 0)
+        for _, _, _, waiter in self._queue:
+            if not waiter.abandoned:
+                queued[waiter.priority] += 1
+        return SchedulerStats(
+            in_flight=self._in_flight,
+            queued=queued,
+            admitted=dict(self._admitted),
+            dropped=dict(self._dropped),
+            mean_wait={
+                priority: self._total_wait[priority] / count if count else 0.0
+                for priority, count in self._admitted.items()
+            },
+            max_wait=dict(self._max_wait),
+        )
+
+
+class Scheduler(_SchedulerBase):
+    """Thread-safe scheduler for sync clients."""
+
+    def __init__(self, max_concurrent: int = 16):
+        super().__init__(max_concurrent)
+        self._lock = threading.Lock()
+
+    def _wake(self, waiter: _Waiter) -> None:
+        waiter.signal.set()
+
+    @contextmanager
+    def slot(self):
+        options = _job_options.get()
+        with self._lock:
+            admitted = self._try_admit(options)
+            if not admitted:
+                waiter = _Waiter(options, threading.Event())
+                self._enqueue(waiter)
+
+        if not admitted:
+            timeout = None
+            if waiter.deadline is not None:
+                timeout = max(0.0, waiter.deadline - time.monotonic())
+            token = _cancel_token.get()
+            if token is not None:
+                token._add_callback(waiter.signal.set)
+            try:
+                waiter.signal.wait(timeout)
+            finally:
+                if token is not None:
+                    token._remove_callback(waiter.signal.set)
+            with self._lock:
+                if not waiter.admitted:
+                    if not waiter.abandoned:
+                        self._abandon(waiter)
+                    if token is not None and token.cancelled:
+                        raise Cancelled("call was cancelled while queued")
+                    raise DeadlineExceeded("job deadline passed while queued")
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        with self._lock:
+            waiter = self._next_waiter()
+            if waiter is not None:
+                self._wake(waiter)
+
+    def stats(self) -> SchedulerStats:
+        with self._lock:
+            return super().stats()
+
+
+class AsyncScheduler(_SchedulerBase):
+    """Scheduler for async clients, must be used from a single event loop."""
+
+    def _wake(self, waiter: _Waiter) -> None:
+        if not waiter.signal.done():
+            waiter.signal.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self):
+        import asyncio
+
+        options = _job_options.get()
+        if not self._try_admit(options):
+            waiter = _Waiter(options, asyncio.get_running_loop().create_future())
+            self._enqueue(waiter)
+
+            timeout = None
+            if waiter.deadline is not None:
+                timeout = max(0.0, waiter.deadline - time.monotonic())
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.signal), timeout)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # hand the slot on if it was given to us while being cancelled
+                if waiter.admitted:
+                    self._release()
+                elif not waiter.abandoned:
+                    self._abandon(waiter)
+                raise
+
+            if not waiter.admitted:
+                if not waiter.abandoned:
+                    self._abandon(waiter)
+                raise DeadlineExceeded("job deadline passed while queued")
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        waiter = self._next_waiter()
+        if waiter is not None:
+            self._wake(waiter)
@@ -1,8 +1,6 @@
 import typing
 from json import dumps, loads
 from logging import getLogger
-from urllib.request import urlopen, Request
-from urllib.error import HTTPError, URLError
 
 from ._base import APIClient, UniformResponse
 
@@ -19,6 +17,10 @@ class UrllibAPIClient(APIClient):
     def _request_raw(
         self, method: str, url: str, body: typing.Optional[dict] = None
     ) -> UniformResponse:
+        # urllib.request pulls in http.client, ssl and email, import on first use
+        from urllib.request import urlopen, Request
+        from urllib.error import HTTPError, URLError
+
         status = 999
         try:
             request = Request(
@@ -1,3 +1,3 @@
-from .extension import build_chromium, build_firefox
+from .extension import build_all, build_chromium, build_firefox, build_profiles
 
-__all__ = ["build_chromium", "build_firefox"]
+__all__ = ["build_all", "build_chromium", "build_firefox", "build_profiles"]
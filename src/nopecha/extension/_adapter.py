@@ -1,7 +1,20 @@
+import typing
+from contextlib import contextmanager
+
+CHUNK_SIZE = 64 * 1024
+
+
+class Response(typing.NamedTuple):
+    status: int
+    headers: typing.Mapping[str, str]
+    content: bytes
+
+
 try:
     from requests import get
 except ImportError:
     from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
     from http.client import HTTPResponse
 
     def request(url: str) -> bytes:
@@ -10,10 +23,45 @@ except ImportError:
         assert isinstance(response, HTTPResponse)
         return response.read()
 
+    def fetch(
+        url: str, headers: typing.Optional[typing.Dict[str, str]] = None
+    ) -> Response:
+        try:
+            response = urlopen(Request(url, headers=headers or {}))
+        except HTTPError as e:
+            # 304 and friends are raised, but they are still responses
+            response = e
+        return Response(response.status, response.headers, response.read())
+
+    @contextmanager
+    def stream(
+        url: str, headers: typing.Optional[typing.Dict[str, str]] = None
+    ) -> typing.Iterator[typing.Tuple[int, typing.Iterator[bytes]]]:
+        try:
+            response = urlopen(Request(url, headers=headers or {}))
+        except HTTPError as e:
+            response = e
+        with response:
+            chunks = iter(lambda: response.read(CHUNK_SIZE), b"")
+            yield response.status, chunks
+
 else:
 
     def request(url: str) -> bytes:
         return get(url).content
 
+    def fetch(
+        url: str, headers: typing.Optional[typing.Dict[str, str]] = None
+    ) -> Response:
+        response = get(url, headers=headers)
+        return Response(response.status_code, response.headers, response.content)
+
+    @contextmanager
+    def stream(
+        url: str, headers: typing.Optional[typing.Dict[str, str]] = None
+    ) -> typing.Iterator[typing.Tuple[int, typing.Iterator[bytes]]]:
+        with get(url, headers=headers, stream=True) as response:
+            yield response.status_code, response.iter_content(CHUNK_SIZE)
+
 
-__all__ = ["request"]
+__all__ = ["Response", "request", "fetch", "stream"]
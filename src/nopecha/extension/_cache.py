@@ -0,0 +1,284 @@
+"""
+On-disk cache shared by every process building extensions on this machine.
+
+    <cache_dir>/releases/<repo>.json          release metadata + etag
+    <cache_dir>/assets/<tag>/<sha256>.zip     downloaded assets, by content
+    <cache_dir>/assets/<tag>/<name>.sha256    asset name -> content hash
+    <cache_dir>/templates/<tag>/<sha256>/     read-only extracted assets
+
+Files are written to a temporary name and renamed into place, so readers never
+see partial files. Downloads take a lock file so a fleet of processes starting
+at once fetches each asset a single time.
+"""
+
+import hashlib
+import os
+import stat
+import time
+import typing
+import uuid
+from contextlib import contextmanager
+from json import dumps, loads
+from pathlib import Path
+from shutil import rmtree
+from zipfile import ZipFile
+
+from ._adapter import CHUNK_SIZE, fetch, stream
+
+__all__ = [
+    "cache_dir",
+    "cached_release",
+    "cached_asset",
+    "cached_template",
+    "remove_tree",
+]
+
+
+def cache_dir() -> Path:
+    if "NOPECHA_CACHE_DIR" in os.environ:
+        return Path(os.environ["NOPECHA_CACHE_DIR"])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "nopecha"
+
+
+def remove_tree(path: Path) -> None:
+    # read-only template files can not be unlinked on windows until they are
+    # made writable again
+    def make_writable(function, name, _):
+        os.chmod(name, stat.S_IWRITE)
+        function(name)
+
+    rmtree(path, onerror=make_writable)
+
+
+def atomic_write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+@contextmanager
+def file_lock(path: Path, *, stale_after: float = 600, poll: float = 0.1):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            pass
+        try:
+            # a crashed holder leaves its lock behind, break it eventually
+            if time.time() - path.stat().st_mtime > stale_after:
+                path.unlink()
+                continue
+        except FileNotFoundError:
+            continue
+        time.sleep(poll)
+
+    try:
+        yield
+    finally:
+        os.close(fd)
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def cached_release(name: str, url: str, ttl: float) -> typing.Any:
+    """
+    Latest release from the GitHub releases `url`, cached for `ttl` seconds.
+    After that the cached copy is revalidated with If-None-Match, which does
+    not count against the GitHub rate limit when nothing changed.
+    """
+    path = cache_dir() / "releases" / f"{name.replace('/', '_')}.json"
+
+    def read_fresh() -> typing.Tuple[typing.Any, bool]:
+        try:
+            cached = loads(path.read_text())
+        except (OSError, ValueError):
+            return None, False
+        return cached, time.time() - cached["fetched_at"] < ttl
+
+    cached, fresh = read_fresh()
+    if fresh:
+        return cached["release"]
+
+    with file_lock(path.with_suffix(".lock")):
+        # only one process revalidates, the others pick up its result
+        cached, fresh = read_fresh()
+        if fresh:
+            return cached["release"]
+        return _revalidate(path, url, cached)
+
+
+def _revalidate(path: Path, url: str, cached: typing.Any) -> typing.Any:
+    headers = { "accept": "application/vnd.github+json" }
+    if cached is not None and cached.get("etag"):
+        headers["if-none-match"] = cached["etag"]
+
+    try:
+        response = fetch(url, headers)
+    except Exception as e:
+        if cached is None:
+            raise
+        print(f"[NopeCHA] Could not check for updates ({e}), using cached release")
+        return cached["release"]
+
+    if response.status == 304 and cached is not None:
+        release, etag = cached["release"], cached.get("etag")
+    elif response.status == 200:
+        release, etag = loads(response.content)[0], response.headers.get("etag")
+    elif cached is not None:
+        print(f"[NopeCHA] GitHub returned {response.status}, using cached release")
+        return cached["release"]
+    else:
+        raise RuntimeError(f"GitHub returned {response.status} for {url}")
+
+    entry = { "etag": etag, "fetched_at": time.time(), "release": release }
+    atomic_write(path, dumps(entry).encode("utf-8"))
+    return release
+
+
+def _asset_digest(asset: typing.Dict[str, typing.Any]) -> typing.Optional[str]:
+    # newer GitHub releases publish "digest": "sha256:<hex>" for each asset
+    digest = asset.get("digest")
+    if isinstance(digest, str) and digest.startswith("sha256:"):
+        return digest[len("sha256:"):]
+    return None
+
+
+def cached_asset(tag: str, asset: typing.Dict[str, typing.Any]) -> Path:
+    """
+    Path to the zip for release asset `asset` of release `tag`, downloading it
+    into the shared cache unless some process already did.
+    """
+    directory = cache_dir() / "assets" / tag
+    index = directory / f"{asset['name']}.sha256"
+
+    def lookup() -> typing.Optional[Path]:
+        digest = _asset_digest(asset)
+        if digest is None and index.exists():
+            digest = index.read_text().strip()
+        if digest is not None and (directory / f"{digest}.zip").exists():
+            return directory / f"{digest}.zip"
+        return None
+
+    found = lookup()
+    if found is not None:
+        return found
+
+    with file_lock(directory / f"{asset['name']}.lock"):
+        # another process may have finished the download while we waited
+        found = lookup()
+        if found is not None:
+            return found
+
+        digest = _download(asset, directory / f"{asset['name']}.part")
+        blob = directory / f"{digest}.zip"
+        os.replace(directory / f"{asset['name']}.part", blob)
+        atomic_write(index, digest.encode("utf-8"))
+        return blob
+
+
+def cached_template(tag: str, asset: typing.Dict[str, typing.Any]) -> Path:
+    """
+    Directory holding the extracted contents of `asset`, extracted once per
+    machine. Files are made read-only since builds hardlink to them.
+    """
+    archive = cached_asset(tag, asset)
+    template = cache_dir() / "templates" / tag / archive.stem
+    if template.exists():
+        return template
+
+    with file_lock(template.with_name(f"{template.name}.lock")):
+        if template.exists():
+            return template
+
+        staging = template.with_name(f".{template.name}.{uuid.uuid4().hex}")
+        try:
+            with ZipFile(archive) as zip:
+                zip.extractall(staging)
+            read_only = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+            for root, _, files in os.walk(staging):
+                for name in files:
+                    os.chmod(os.path.join(root, name), read_only)
+            os.replace(staging, template)
+        finally:
+            if staging.exists():
+                remove_tree(staging)
+    return template
+
+
+def _download(
+    asset: typing.Dict[str, typing.Any], part: Path, *, max_attempts: int = 5
+) -> str:
+    """
+    Stream `asset` into `part` and return its sha256. An existing partial file
+    (from an interrupted run or a failed attempt) is resumed with a Range
+    request. Size and digest are checked against what GitHub advertises.
+    """
+    url = asset["browser_download_url"]
+    expected_size = asset.get("size")
+    expected_digest = _asset_digest(asset)
+
+    for attempt in range(1, max_attempts + 1):
+        offset = part.stat().st_size if part.exists() else 0
+        if expected_size is not None and offset > expected_size:
+            part.unlink()
+            offset = 0
+
+        resume = f" from byte {offset}" if offset else ""
+        print(f"[NopeCHA] Downloading {url}{resume}")
+        try:
+            headers = { "range": f"bytes={offset}-" } if offset else {}
+            with stream(url, headers) as (status, chunks):
+                if status == 416:
+                    # nothing left to send, what we have is all there is
+                    pass
+                elif status == 206 and offset:
+                    with part.open("ab") as file:
+                        for chunk in chunks:
+                            file.write(chunk)
+                elif status == 200:
+                    # the server ignored the range, start over
+                    with part.open("wb") as file:
+                        for chunk in chunks:
+                            file.write(chunk)
+                else:
+                    raise RuntimeError(f"Server returned {status} for {url}")
+        except Exception as e:
+            if attempt == max_attempts:
+                raise
+            print(f"[NopeCHA] Download interrupted ({e}), resuming")
+            continue
+
+        size = part.stat().st_size
+        digest = _file_digest(part)
+        if expected_size is not None and size != expected_size:
+            problem = f"has {size} bytes, expected {expected_size}"
+        elif expected_digest is not None and digest != expected_digest:
+            problem = f"has sha256 {digest}, expected {expected_digest}"
+        else:
+            return digest
+
+        # a corrupt partial file can not be resumed, discard it
+        part.unlink()
+        if attempt == max_attempts:
+            raise RuntimeError(f"Downloaded {asset['name']} {problem}")
+        print(f"[NopeCHA] Downloaded {asset['name']} {problem}, retrying")
+
+    raise AssertionError("unreachable")
+
+
+def _file_digest(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with path.open("rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
@@ -1,72 +1,106 @@
+import os
 import typing
-from shutil import rmtree
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from shutil import copy2
 from json import dumps, loads
 from pathlib import Path
-from io import BytesIO
 from zipfile import ZipFile
 
-from ._adapter import request
+from ._cache import cached_asset, cached_release, cached_template, remove_tree
 
 REPO = "NopeCHALLC/nopecha-extension"
+# how long release metadata is trusted before it is revalidated with GitHub
+RELEASE_TTL = 10 * 60
 
 __all__ = [
     "build",
+    "build_all",
     "build_chromium",
     "build_firefox",
+    "build_profiles",
 ]
 
 
-def get_latest_release() -> typing.Any:
+def get_latest_release(ttl: float = RELEASE_TTL) -> typing.Any:
     releases_url = f"https://api.github.com/repos/{REPO}/releases?per_page=1"
-    return loads(request(releases_url))[0]
-
-
-def download_release(download_url: str, outpath: Path) -> None:
-    print(f"[NopeCHA] Downloading {download_url} to {outpath}")
-
-    if outpath.exists():
-        rmtree(outpath)
-    outpath.mkdir(parents=True, exist_ok=True)
-
-    content = request(download_url)
-    with ZipFile(BytesIO(content)) as zip:
-        zip.extractall(outpath)
-
-    print(f"[NopeCHA] Downloaded {download_url} to {outpath}")
+    return cached_release(REPO, releases_url, ttl)
+
+
+def download_release(
+    release: typing.Any, asset: typing.Dict[str, typing.Any], outpath: Path
+) -> None:
+    archive = cached_asset(release["tag_name"], asset)
+    print(f"[NopeCHA] Extracting {asset['name']} to {outpath}")
+
+    # extract next to the destination and swap it in with renames, so a failed
+    # update leaves the previous extension in place
+    outpath.parent.mkdir(parents=True, exist_ok=True)
+    staging = outpath.with_name(f".{outpath.name}.{uuid.uuid4().hex}.staging")
+    try:
+        with ZipFile(archive) as zip:
+            zip.extractall(staging)
+        replace_directory(staging, outpath)
+    finally:
+        if staging.exists():
+            remove_tree(staging)
+
+    print(f"[NopeCHA] Extracted {asset['name']} to {outpath}")
+
+
+def replace_directory(source: Path, destination: Path) -> None:
+    if not destination.exists():
+        os.replace(source, destination)
+        return
+
+    backup = destination.with_name(f".{destination.name}.{uuid.uuid4().hex}.old")
+    os.replace(destination, backup)
+    try:
+        os.replace(source, destination)
+    except BaseException:
+        os.replace(backup, destination)
+        raise
+    remove_tree(backup)
+
+
+def find_asset(
+    release: typing.Any, branch: typing.Literal["chromium", "firefox"]
+) -> typing.Dict[str, typing.Any]:
+    for asset in release["assets"]:
+        if asset["name"] == f"{branch}_automation.zip":
+            return asset
+    raise RuntimeError(f"Could not find download link for {branch}")
 
 
 def build(
     branch: typing.Literal["chromium", "firefox"],
     manifest: typing.Dict[str, typing.Any],
     outpath: typing.Optional[Path] = None,
+    *,
+    release: typing.Any = None,
 ) -> str:
     if outpath is None:
         outpath = Path(f"nopecha-{branch}")
 
-    latest_release = get_latest_release()
+    latest_release = get_latest_release() if release is None else release
 
-    for asset in latest_release["assets"]:
-        if asset["name"] == f"{branch}_automation.zip":
-            download_url = asset["browser_download_url"]
-            break
-    else:
-        raise RuntimeError(f"Could not find download link for {branch}")
+    asset = find_asset(latest_release, branch)
 
     if outpath.exists():
-        manifest = loads((outpath / "manifest.json").read_text())
-        if manifest["version_name"] != latest_release["tag_name"]:
+        current = loads((outpath / "manifest.json").read_text())
+        if current["version_name"] != latest_release["tag_name"]:
             print(
-                f"[NopeCHA] {latest_release['tag_name']} is available, you got {manifest['version_name']}"
+                f"[NopeCHA] {latest_release['tag_name']} is available, you got {current['version_name']}"
             )
-            download_release(download_url, outpath)
+            download_release(latest_release, asset, outpath)
 
     else:
         print(f"[NopeCHA] Downloading {latest_release['tag_name']}")
-        download_release(download_url, outpath)
+        download_release(latest_release, asset, outpath)
 
-    manifest = loads((outpath / "manifest.json").read_text())
-    manifest["nopecha"].update(manifest)
-    (outpath / "manifest.json").write_text(dumps(manifest, indent=2))
+    extension_manifest = loads((outpath / "manifest.json").read_text())
+    extension_manifest["nopecha"].update(manifest)
+    (outpath / "manifest.json").write_text(dumps(extension_manifest, indent=2))
 
     print(f"[NopeCHA] Built {branch} extension to {outpath}")
 
@@ -83,3 +117,89 @@ def build_firefox(
     manifest: typing.Dict[str, typing.Any], outpath: typing.Optional[Path] = None
 ) -> str:
     return build("firefox", manifest, outpath)
+
+
+def build_all(
+    manifest: typing.Dict[str, typing.Any],
+    outpaths: typing.Optional[
+        typing.Dict[typing.Literal["chromium", "firefox"], Path]
+    ] = None,
+) -> typing.Dict[typing.Literal["chromium", "firefox"], str]:
+    """
+    Build the chromium and firefox extensions with the same settings.
+
+    The release is looked up once, both assets are downloaded and extracted
+    in parallel. Returns the output path of each branch.
+    """
+    outpaths = outpaths or {}
+    release = get_latest_release()
+    branches: typing.Tuple[typing.Literal["chromium", "firefox"], ...] = (
+        "chromium",
+        "firefox",
+    )
+
+    with ThreadPoolExecutor(len(branches)) as pool:
+        futures = {
+            branch: pool.submit(
+                build, branch, manifest, outpaths.get(branch), release=release
+            )
+            for branch in branches
+        }
+        return { branch: future.result() for branch, future in futures.items() }
+
+
+def build_profiles(
+    branch: typing.Literal["chromium", "firefox"],
+    profiles: typing.Mapping[typing.Union[str, Path], typing.Dict[str, typing.Any]],
+) -> typing.List[str]:
+    """
+    Build one extension per browser profile, `profiles` maps each output
+    directory to the settings for its manifest.
+
+    The release is extracted once into a shared read-only template, each
+    profile hardlinks to the template's files (copying them only when the
+    output is on another filesystem) and gets its own manifest.json.
+    """
+    release = get_latest_release()
+    template = cached_template(release["tag_name"], find_asset(release, branch))
+    base_manifest = (template / "manifest.json").read_text()
+
+    directories, files = [], []
+    for root, dirnames, filenames in os.walk(template):
+        relative = Path(root).relative_to(template)
+        directories.extend(relative / name for name in dirnames)
+        files.extend(relative / name for name in filenames if name != "manifest.json")
+
+    outpaths = []
+    for outpath, settings in profiles.items():
+        outpath = Path(outpath)
+        outpath.parent.mkdir(parents=True, exist_ok=True)
+        staging = outpath.with_name(f".{outpath.name}.{uuid.uuid4().hex}.staging")
+        try:
+            staging.mkdir()
+            for directory in directories:
+                (staging / directory).mkdir()
+            for file in files:
+                link_or_copy(template / file, staging / file)
+
+            manifest = loads(base_manifest)
+            manifest["nopecha"].update(settings)
+            (staging / "manifest.json").write_text(dumps(manifest, indent=2))
+
+            replace_directory(staging, outpath)
+        finally:
+            if staging.exists():
+                remove_tree(staging)
+        outpaths.append(str(outpath))
+
+    print(f"[NopeCHA] Built {len(outpaths)} {branch} extensions from {template}")
+
+    return outpaths
+
+
+def link_or_copy(source: Path, destination: Path) -> None:
+    try:
+        os.link(source, destination)
+    except OSError:
+        # cross-device or no hardlink support on this filesystem
+        copy2(source, destination)
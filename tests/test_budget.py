@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from nopecha.api.budget import Budget, BudgetExceeded
+
+
+def test_waiters_queue_up_behind_each_other():
+    budget = Budget(rate=1, max_wait=10)
+    delays = [budget.take(1) for _ in range(4)]
+    assert delays[0] == 0
+    for earlier, later in zip(delays, delays[1:]):
+        assert later == pytest.approx(earlier + 1, abs=0.05)
+
+
+def test_max_wait_bounds_the_total_wait():
+    budget = Budget(rate=1, max_wait=2)
+    delays, failures = [], []
+    lock = threading.Lock()
+
+    def submit():
+        try:
+            delay = budget.take(1)
+        except BudgetExceeded:
+            with lock:
+                failures.append(None)
+        else:
+            with lock:
+                delays.append(delay)
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(delays) == 3
+    assert len(failures) == 5
+    assert max(delays) <= 2
+
+
+def test_refund_gives_the_place_back():
+    budget = Budget(rate=1, max_wait=1)
+    assert budget.take(1) == 0
+    assert budget.take(1) == pytest.approx(1, abs=0.05)
+    with pytest.raises(BudgetExceeded):
+        budget.take(1)
+    budget.refund(1)
+    assert budget.take(1) == pytest.approx(1, abs=0.05)
+
+
+def test_credit_exhausted():
+    budget = Budget(reserve=10)
+    budget.update({"credit": 12})
+    budget.take(2)
+    with pytest.raises(BudgetExceeded):
+        budget.take(1)
+
+
+def test_views_for_other_keys_are_refused():
+    from nopecha.api._base import APIClient
+
+    class Client(APIClient):
+        def _request_raw(self, method, url, body=None):
+            raise AssertionError("no requests expected")
+
+    client = Client("key", budget=Budget())
+    assert client.with_key("key").budget is client.budget
+    with pytest.raises(ValueError):
+        client.with_key("other")